@@ -2,27 +2,432 @@
 # coding: utf-8
 
 # # load_problem
-# Given a `namefile` of a tsp file, like "st70.tsp", collocated in the right path, the function returns the `problem` object, containing relevant informations about that tsp file, like the list of the nodes with their own coordinates.
+# Given a `namefile` of a tsp file, like "st70.tsp", collocated in the right path (see `Data_File()`), the function returns the `problem` object, containing relevant informations about that tsp file, like the list of the nodes with their own coordinates.
+# <br>
+# It also builds the coordinates and the distance matrix used by `distance()`, while the file is read by `Read_Problem()`.
+# <br>
+# If `Use_Cache` is True, the distance matrix and the matrix of the nearest neighbors already computed for the same file are opened from the cache (see `Preprocessing_Cache`), instead of being built again.
 
 # In[1]:
 
 
-import tsplib95
-global problem, counter_call_Make_2_Opt_Move, counter_call_Gain_From_2_Opt, counter_call_One_City_2_Opt
+global problem, coordinates, distanceMatrix, sharedNeighbors
+sharedNeighbors = None
 def load_problem(namefile):
-    global problem
-    problem = tsplib95.load("Network Optimization\\ALL_tsp\\"+str(namefile)+"\\"+str(namefile))
+    global problem, coordinates, distanceMatrix, sharedNeighbors, problemKey
+    problem = Read_Problem(namefile)
+    problemKey = Problem_Key(namefile) if Use_Cache else None
+    coordinates = Build_Coordinates(problem)
+    sharedNeighbors = Load_Cached("neighbors")
+    distanceMatrix = Load_Cached("distances")
+    if distanceMatrix is None:
+        distanceMatrix = Build_Distance_Matrix(problem, coordinates)
+        if distanceMatrix is not None:
+            Save_Cached("distances", distanceMatrix)
     return problem
 
 
+# # Read_Problem
+# Reads the tsp file `namefile` from `ALL_tsp` and returns the `problem` object, without building anything else.
+# <br>
+# The file is read by `Read_TSPLIB()`; only if it uses a format that it doesn't know, it is read by `tsplib95`.
+
+# In[ ]:
+
+
+def Read_Problem(namefile):
+    fileName = Data_File(namefile)
+    try:
+        return Read_TSPLIB(fileName)
+    except NotImplementedError:
+        import tsplib95 # only for the formats not read by Read_TSPLIB()
+        return tsplib95.load(fileName)
+
+
+# # Data_File
+# The directories of the data: `TSP_Directory` (the `ALL_tsp` directory, with the `.tsp` and `.opt.tour` files) and `Solutions_Directory` (the tours and the `.csv` files saved, see `save_in_file()` and `save_time_and_distance()`). They can be changed before calling the other functions; the paths are built with `os.path`, so they work on every operating system.
+# <br>
+# `Data_File()` returns the path of the file `fileName` of `TSP_Directory`: in `ALL_tsp` each file is in a directory with its own name (`ALL_tsp/st70.tsp/st70.tsp`), but the file can also be directly in `TSP_Directory`, or `fileName` can be a path of an existing file.
+
+# In[ ]:
+
+
+import os
+TSP_Directory = os.path.join("Network Optimization", "ALL_tsp")
+Solutions_Directory = os.path.join("Network Optimization", "solutions")
+def Data_File(fileName):
+    fileName = str(fileName)
+    inDirectory = os.path.join(TSP_Directory, fileName, fileName)
+    for candidate in [inDirectory, os.path.join(TSP_Directory, fileName), fileName]:
+        if os.path.isfile(candidate):
+            return candidate
+    return inDirectory
+
+def Solution_File(fileName):
+    return os.path.join(Solutions_Directory, fileName)
+
+
+# # Preprocessing_Cache
+# Cache on disk of the preprocessing of the problems, in `Cache_Directory`: the distance matrix (see `Build_Distance_Matrix()`) and the matrix of the nearest neighbors (see `Build_Neighbors_Matrix()`) are saved as `.npy` files, whose names start with `problemKey`, the name of the tsp file followed by the hash of its content (so a changed file is never read from an old cache).
+# <br>
+# `load_problem()` opens the files already saved with `np.load(mmap_mode="r")`: the matrices are not read or built again, only the pages used are read, and the processes that open the same file share them (also the processes of `solveTSP_MultiStart()`, see `Share_Problem()`, and of `Batch_Solve()`).
+# <br>
+# The neighbors are saved with at least `Cache_Min_Neighbors` columns and sliced for the searches with less neighbors; a search with more neighbors builds them again and replaces the file. The files are written in a temporary file and then renamed, so a process never reads a file half written; if the cache can't be written the matrices are only kept in memory.
+# <br>
+# The cache is used only if `Use_Cache` is set to True (it is False by default: nothing is read or written). The files in `Cache_Directory` take at most `Cache_Max_Bytes` bytes together: before saving a file, the least recently used ones (a file is used when it is saved or opened) are deleted to make room for it, and a matrix larger than `Cache_Max_Bytes` is never saved.
+
+# In[ ]:
+
+
+import hashlib
+Use_Cache = False
+Cache_Directory = os.path.join("Network Optimization", "cache")
+Cache_Min_Neighbors = 16
+Cache_Max_Bytes = 2**30
+problemKey = None
+def Problem_Key(namefile):
+    with open(Data_File(namefile), "rb") as file:
+        digest = hashlib.sha1(file.read()).hexdigest()[:16]
+    return os.path.splitext(os.path.basename(str(namefile)))[0] + "_" + digest
+
+def Cache_File(name):
+    return os.path.join(Cache_Directory, problemKey + "_" + name + ".npy")
+
+def Load_Cached(name):
+    if problemKey is None or not os.path.isfile(Cache_File(name)):
+        return None
+    try:
+        os.utime(Cache_File(name)) # used now, see Free_Cache_Space()
+    except OSError:
+        pass
+    return np.load(Cache_File(name), mmap_mode="r")
+
+def Save_Cached(name, values):
+    if problemKey is None or values.nbytes > Cache_Max_Bytes:
+        return values
+    temporary = Cache_File(name) + "." + str(os.getpid()) + ".tmp"
+    try:
+        os.makedirs(Cache_Directory, exist_ok=True)
+        Free_Cache_Space(values.nbytes, Cache_File(name))
+        with open(temporary, "wb") as file:
+            np.save(file, values)
+        os.replace(temporary, Cache_File(name))
+    except OSError:
+        return values
+    return Load_Cached(name)
+
+def Free_Cache_Space(size, replaced):
+    files = []
+    for name in os.listdir(Cache_Directory):
+        fileName = os.path.join(Cache_Directory, name)
+        if name.endswith(".npy") and fileName != replaced:
+            status = os.stat(fileName)
+            files.append((status.st_mtime, status.st_size, fileName))
+    used = sum(fileSize for lastUse, fileSize, fileName in files)
+    for lastUse, fileSize, fileName in sorted(files): # the least recently used first
+        if used + size <= Cache_Max_Bytes:
+            break
+        os.remove(fileName)
+        used -= fileSize
+
+
+# # Read_TSPLIB
+# Reads a file in the TSPLIB format and returns a `TSPLIB_Problem`, with the data of the file in `numpy` arrays: the file is read as a single string, and each section is converted all together by `numpy`, without building the Python objects of each node.
+# <br>
+# It reads the problems with NODE_COORD_SECTION and EDGE_WEIGHT_TYPE EUC_2D, EUC_3D, CEIL_2D, MAN_2D, MAN_3D, MAX_2D, MAX_3D, ATT or GEO (the distances are computed by `Coordinates_Distances()`), or with EDGE_WEIGHT_TYPE EXPLICIT and EDGE_WEIGHT_SECTION in all the EDGE_WEIGHT_FORMAT (the matrix is kept in `weights`), and the tours of the files `.tour` and `.opt.tour` (TOUR_SECTION, in `tours`). With the other formats it raises `NotImplementedError`.
+# <br>
+# The cities are always numbered from 1 to N, as in the other problems (also the explicit ones, that `tsplib95` numbers from 0).
+# <br>
+# `TSPLIB_Problem` has the attributes and the methods of the `tsplib95` problems used in this module: `name`, `type`, `dimension`, `edge_weight_type`, `node_coords` (the coordinates of a city, or of its DISPLAY_DATA_SECTION, are `node_coords[city]`), `tours`, `get_nodes()` and `get_weight()`.
+
+# In[ ]:
+
+
+import re
+import numpy as np
+Coordinates_Types = {"EUC_2D": 2, "CEIL_2D": 2, "MAN_2D": 2, "MAX_2D": 2, "ATT": 2, "GEO": 2, "EUC_3D": 3, "MAN_3D": 3, "MAX_3D": 3}
+Explicit_Formats = {"FULL_MATRIX": None, "UPPER_ROW": (np.triu_indices, 1), "LOWER_COL": (np.triu_indices, 1), "UPPER_DIAG_ROW": (np.triu_indices, 0), "LOWER_DIAG_COL": (np.triu_indices, 0),
+                    "LOWER_ROW": (np.tril_indices, -1), "UPPER_COL": (np.tril_indices, -1), "LOWER_DIAG_ROW": (np.tril_indices, 0), "UPPER_DIAG_COL": (np.tril_indices, 0)} # the column formats are the row formats of the other triangle
+sectionPattern = re.compile(r"^[ \t]*([A-Z_]+_SECTION|EOF)[ \t]*:?[ \t]*$", re.MULTILINE)
+
+class TSPLIB_Problem:
+    def __init__(self, specification, coords = None, weights = None, display = None, tours = None):
+        self.name = specification.get("NAME", "")
+        self.type = specification.get("TYPE", "")
+        self.dimension = int(specification.get("DIMENSION", 0))
+        self.edge_weight_type = specification.get("EDGE_WEIGHT_TYPE")
+        self.coords = coords
+        self.weights = weights
+        self.node_coords = coords if coords is not None else (display if display is not None else {})
+        self.tours = tours if tours is not None else []
+
+    def get_nodes(self):
+        return range(1, self.dimension + 1)
+
+    def get_weight(self, cityOne, cityTwo):
+        if self.weights is not None:
+            return int(self.weights[cityOne, cityTwo])
+        return int(Coordinates_Distances(self.coords[cityOne], self.coords[cityTwo], self.edge_weight_type))
+
+def Read_TSPLIB(fileName):
+    with open(fileName) as file:
+        text = file.read()
+    sections = {}
+    matches = list(sectionPattern.finditer(text))
+    for index, match in enumerate(matches):
+        end = matches[index+1].start() if index+1 < len(matches) else len(text)
+        sections[match.group(1)] = text[match.end():end]
+    specification = {}
+    for line in text[:matches[0].start() if matches else len(text)].splitlines():
+        if ":" in line:
+            key, value = line.split(":", 1)
+            specification[key.strip().upper()] = value.strip()
+    N = int(specification.get("DIMENSION", 0))
+    weightType = specification.get("EDGE_WEIGHT_TYPE")
+    if "TOUR_SECTION" in sections:
+        values = Section_Numbers(sections["TOUR_SECTION"], np.int64)
+        tours = [part[part != -1].tolist() for part in np.split(values, np.flatnonzero(values == -1))] # each tour ends with -1
+        return TSPLIB_Problem(specification, tours = [tour for tour in tours if len(tour) > 0])
+    if weightType in Coordinates_Types and "NODE_COORD_SECTION" in sections:
+        return TSPLIB_Problem(specification, coords = Section_Coordinates(sections["NODE_COORD_SECTION"], N, Coordinates_Types[weightType]))
+    if weightType == "EXPLICIT" and "EDGE_WEIGHT_SECTION" in sections and specification.get("EDGE_WEIGHT_FORMAT") in Explicit_Formats:
+        values = Section_Numbers(sections["EDGE_WEIGHT_SECTION"], np.float64)
+        weights = np.zeros((N+1, N+1), dtype=np.int64)
+        triangle = Explicit_Formats[specification["EDGE_WEIGHT_FORMAT"]]
+        if triangle is None:
+            weights[1:, 1:] = values[:N*N].reshape(N, N)
+        else:
+            rows, columns = triangle[0](N, triangle[1])
+            weights[rows+1, columns+1] = values[:len(rows)]
+            weights[columns+1, rows+1] = values[:len(rows)]
+        display = None
+        if "DISPLAY_DATA_SECTION" in sections:
+            display = Section_Coordinates(sections["DISPLAY_DATA_SECTION"], N, 2)
+        return TSPLIB_Problem(specification, weights = weights, display = display)
+    raise NotImplementedError("Read_TSPLIB can't read " + str(fileName))
+
+def Section_Numbers(section, dtype):
+    return np.fromstring(section, dtype=dtype, sep=" ")
+
+def Section_Coordinates(section, N, dimensions):
+    values = Section_Numbers(section, np.float64).reshape(-1, dimensions + 1)
+    cities = values[:, 0].astype(np.int64)
+    if len(cities) != N or cities.min() < 1 or cities.max() > N:
+        raise NotImplementedError("the cities are not numbered from 1 to N")
+    coords = np.zeros((N+1, dimensions))
+    coords[cities] = values[:, 1:]
+    return coords
+
+
+# # Instrumentation
+# Counts and times of the operators and of the phases of the local searches, collected in the registry `counters` (number of calls or events, by name) and `timers` (seconds, by name) while `instrumentation` is True.
+# <br>
+# The names are: the gains evaluated (`Gain_From_2_Opt`, `Gain_From_3_Opt`, `Gain_From_Segment_Shift`), the searches from one city without speedup (`One_City_2_Opt`), the cities skipped for their don't look bit (`DLB_skips`), the moves applied (`Make_2_Opt_Move`, `Make_3_Opt_Move`, `Make_Segment_Shift_Move`, `TwoLevel_2_Opt_Move`) and the phases (`load_problem`, `Build_Neighbors_Matrix`, `construction`, `local_search`, `LS_sweep` for each pass over all the cities, `LS_queue` for the search from the queue of the active cities with DLB), the cities taken from that queue (`active_cities`); the phases are also timed, with `Timed()`, while the moves are only counted, because timing each of them would cost more than the move itself.
+# <br>
+# `instrumentation` is False by default: it must be set to True before the runs to be measured. With `instrumentation` False the cost is only the check of the flag. `Reset_Instrumentation()` clears the registry and `Instrumentation_Columns()` returns it as columns for `tsp.csv` (`count_` and `time_` followed by the name).
+
+# In[ ]:
+
+
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+instrumentation = False
+counters = Counter()
+timers = Counter()
+def Reset_Instrumentation():
+    counters.clear()
+    timers.clear()
+
+def Timed(name):
+    if not instrumentation:
+        return noTiming
+    return Timing(name)
+
+noTiming = nullcontext()
+@contextmanager
+def Timing(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        counters[name] += 1
+        timers[name] += time.perf_counter() - start
+
+def Instrumentation_Columns():
+    columns = {}
+    for name in sorted(counters):
+        columns["count_" + name] = counters[name]
+    for name in sorted(timers):
+        columns["time_" + name] = timers[name]
+    return columns
+
+
+# # Search_Budget
+# State of the running local search, in `searchStatus`: its budget of time and of moves, and the length of the current tour.
+# <br>
+# `Start_Search()` is called at the start of each local search (`LS_2_Opt_NoSpeedup()`, `LS_2_Opt()`, `LS_3_Opt()`, `LS_Or_Opt()`, `LS_LK()`) with the initial `tour` (with the first city repeated at the end), its `timeLimit` (seconds) and `moveLimit` (number of improving moves), None if there is no limit.
+# <br>
+# The searches call `Budget_Exhausted()` before the search from each city and stop, returning the current tour, when it is True. After a search, `searchStatus["exhausted"]` is True if it has been stopped by the budget, so the tour can be not locally optimal.
+# <br>
+# Every improving move is passed to `Track_Move()` with its gain (the `One_City_*` searches return the gain of the move applied, 0 if none), so `searchStatus["length"]` is the length of the current tour without computing it again. If `Length_Check_Every` is not None, every `Length_Check_Every` moves the length is computed exactly with `Cyclic_Length()` and corrected if it is different (`length_drift` in the instrumentation).
+# <br>
+# `searchStatus["searched"]` counts the cities searched, `searchStatus["DontLook"]` is the `DontLookBits` of the running search with DLB (see `LS_Active_Cities()`), and if `searchStatus["stop"]` is set to True (by `solveTSP_Progress()`) the search stops as if the budget were exhausted. If `Progress_Hook` is not None, it is called before the search from each city.
+
+# In[ ]:
+
+
+searchStatus = {"deadline": None, "moveLimit": None, "moves": 0, "exhausted": False, "length": 0, "searched": 0, "DontLook": None, "stop": False}
+Length_Check_Every = None
+Progress_Hook = None
+def Start_Search(tour, timeLimit = None, moveLimit = None):
+    searchStatus["length"] = totalDistance(tour)
+    searchStatus["deadline"] = None if timeLimit == None else time.perf_counter() + timeLimit
+    searchStatus["moveLimit"] = moveLimit
+    searchStatus["moves"] = 0
+    searchStatus["exhausted"] = False
+    searchStatus["searched"] = 0
+    searchStatus["DontLook"] = None
+
+def Budget_Exhausted():
+    searchStatus["searched"] += 1
+    if Progress_Hook is not None:
+        Progress_Hook()
+    if not searchStatus["exhausted"]:
+        if searchStatus["stop"]:
+            searchStatus["exhausted"] = True
+        elif searchStatus["deadline"] != None and time.perf_counter() >= searchStatus["deadline"]:
+            searchStatus["exhausted"] = True
+        elif searchStatus["moveLimit"] != None and searchStatus["moves"] >= searchStatus["moveLimit"]:
+            searchStatus["exhausted"] = True
+    return searchStatus["exhausted"]
+
+def Track_Move(tour, gain):
+    searchStatus["moves"] += 1
+    searchStatus["length"] -= gain
+    if Length_Check_Every != None and searchStatus["moves"] % Length_Check_Every == 0:
+        exactLength = Cyclic_Length(tour)
+        if exactLength != searchStatus["length"]:
+            if instrumentation:
+                counters["length_drift"] += 1
+            searchStatus["length"] = exactLength
+
+def Cyclic_Length(tour):
+    if isinstance(tour, TwoLevelTour):
+        tour = list(tour.sequence())
+    return totalDistance(list(tour) + [tour[0]])
+
+
+# # Build_Coordinates
+# Copies the coordinates of the nodes of the `problem` in a `numpy` array: `coordinates[city]` are the coordinates of `city` (the row 0 is not used because there is no city with number 0).
+# <br>
+# It returns `None` if the distances of the problem can't be computed with `Coordinates_Distances()` (for example if they are given explicitly in the file).
+
+# In[ ]:
+
+
+import numpy as np
+coordinates = None
+def Build_Coordinates(problem):
+    if isinstance(problem, TSPLIB_Problem): # already read in an array by Read_TSPLIB()
+        return problem.coords
+    nodes = list(problem.get_nodes())
+    N = len(nodes)
+    if len(problem.node_coords) != N or problem.edge_weight_type not in ["EUC_2D", "EUC_3D", "CEIL_2D", "MAN_2D", "MAN_3D", "MAX_2D", "MAX_3D", "ATT", "GEO"]:
+        return None
+    coords = np.zeros((N+1, len(problem.node_coords[nodes[0]])))
+    for city in nodes:
+        coords[city] = problem.node_coords[city]
+    return coords
+
+
+# # Build_Distance_Matrix
+# Builds once, when the problem is loaded, the matrix of all the distances between the cities, so that the local searches don't have to ask them to `tsplib95` every time.
+# <br>
+# `distanceMatrix[a][b]` is the distance between city `a` and city `b`: the row and the column 0 are not used because there is no city with number 0.
+# <br>
+# If the problem has the `coords` of the nodes (see `Build_Coordinates()`), all the distances are computed together with `numpy`, one block of rows at a time, following the rounding rules of the TSPLIB standard for the types EUC_2D, EUC_3D, CEIL_2D, MAN_2D, MAX_2D, ATT and GEO; an explicit matrix read by `Read_TSPLIB()` is copied; with the other types it asks each distance to `tsplib95` only once.
+# <br>
+# The matrix is filled as `int32`, and it becomes `int64` only if a distance is at least 2^29 (so that the sum of the distances in a gain can't overflow): so the memory for the usual instances is never doubled, also while the matrix is built.
+# <br>
+# If the problem has more than `Max_Distance_Matrix_Cities` cities the matrix isn't built (it wouldn't fit in memory) and it returns `None`: in this case `distance()` asks each distance to the `problem`.
+
+# In[ ]:
+
+
+distanceMatrix = None
+Max_Distance_Matrix_Cities = 15000
+def Build_Distance_Matrix(problem, coords):
+    nodes = list(problem.get_nodes())
+    N = len(nodes)
+    if N > Max_Distance_Matrix_Cities:
+        return None
+    matrix = np.zeros((N+1, N+1), dtype=np.int32) # half of the memory for the usual instances (and the sum of 3 or 4 distances in a gain can't overflow)
+    weightType = problem.edge_weight_type
+    def Set_Rows(rows, columns, values):
+        nonlocal matrix
+        if matrix.dtype == np.int32 and values.max(initial=0) >= 2**29:
+            matrix = matrix.astype(np.int64) # too long distances for the int32
+        matrix[rows, columns] = values
+    if getattr(problem, "weights", None) is not None: # explicit matrix read by Read_TSPLIB()
+        Set_Rows(slice(None), slice(None), problem.weights)
+    elif coords is not None:
+        rowsPerBlock = max(1, 2**22 // (N+1)) # to limit the memory used by the temporary arrays
+        for firstRow in range(1, N+1, rowsPerBlock):
+            rows = slice(firstRow, min(firstRow + rowsPerBlock, N+1))
+            Set_Rows(rows, slice(1, None), Coordinates_Distances(coords[rows, np.newaxis, :], coords[np.newaxis, 1:, :], weightType))
+    else:
+        for cityOne in nodes:
+            Set_Rows(cityOne, nodes, np.array([problem.get_weight(cityOne, cityTwo) for cityTwo in nodes], dtype=np.int64))
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+# # Coordinates_Distances
+# Given two arrays of coordinates (with the coordinates on the last axis), returns the array of the distances between them, rounded as the TSPLIB standard says for the `weightType` of the problem (the same rules used by `tsplib95`).
+
+# In[ ]:
+
+
+def Coordinates_Distances(start, end, weightType):
+    deltas = end - start
+    if weightType in ["MAN_2D", "MAN_3D"]:
+        return np.floor(np.abs(deltas).sum(axis=-1) + 0.5).astype(np.int64)
+    if weightType in ["MAX_2D", "MAX_3D"]:
+        return np.floor(np.abs(deltas).max(axis=-1) + 0.5).astype(np.int64)
+    if weightType == "GEO":
+        degrees = np.trunc(start) # the coordinates are written as DDD.MM (degrees and minutes)
+        startRad = np.radians(degrees + (start - degrees) * 5 / 3)
+        degrees = np.trunc(end)
+        endRad = np.radians(degrees + (end - degrees) * 5 / 3)
+        q1 = np.cos(startRad[..., 1] - endRad[..., 1])
+        q2 = np.cos(startRad[..., 0] - endRad[..., 0])
+        q3 = np.cos(startRad[..., 0] + endRad[..., 0])
+        arc = np.arccos(np.clip(0.5 * ((1 + q1) * q2 - (1 - q1) * q3), -1, 1))
+        return np.trunc(6378.388 * arc + 1).astype(np.int64)
+    squareDistance = (deltas * deltas).sum(axis=-1)
+    if weightType == "ATT":
+        value = np.sqrt(squareDistance / 10)
+        result = np.floor(value + 0.5)
+        result += result < value # pseudo euclidean distance is never rounded down
+        return result.astype(np.int64)
+    if weightType == "CEIL_2D":
+        return np.ceil(np.sqrt(squareDistance)).astype(np.int64)
+    return np.floor(np.sqrt(squareDistance) + 0.5).astype(np.int64) # EUC_2D and EUC_3D
+
+
 # # distance
-# Given two nodes, the function returns the euclidean distance between their coordinates, that is the weight of the arc connecting the two nodes
+# Given two nodes, the function returns the euclidean distance between their coordinates, that is the weight of the arc connecting the two nodes.
+# <br>
+# It reads it from `distanceMatrix` if it has been built by `load_problem()`, otherwise it asks it to the `problem` (`get_weight()`).
 
 # In[ ]:
 
 
 def distance(cityOne, cityTwo):
     global problem
+    if distanceMatrix is not None:
+        return distanceMatrix.item(cityOne, cityTwo)
     edge = cityOne, cityTwo
     weight = problem.get_weight(*edge) #distance between the two
     return weight
@@ -35,6 +440,9 @@ def distance(cityOne, cityTwo):
 
 
 def totalDistance(tour):
+    if distanceMatrix is not None:
+        cities = np.asarray(tour)
+        return int(distanceMatrix[cities[:-1], cities[1:]].sum(dtype=np.int64)) #all the distances of the tour read together from the matrix
     totDist = 0
     for i in range(len(tour)-1):
         totDist += distance(tour[i], tour[i+1])
@@ -89,6 +497,118 @@ def Build_Random_Tour(nodes):
     return tour
 
 
+# # Build_Greedy_Tour
+# Builds the tour with the greedy edge (matching) technique: the links between each city and its `Greedy_No_Of_Neighbors` nearest neighbors (see `Build_Neighbors_Matrix()`) are considered from the shortest one, and a link is added if its two cities have less than two links and it doesn't close a cycle (the cities already linked are kept in a union-find structure, `fragmentOf`).
+# <br>
+# At the end the links form some paths (fragments): starting from the end of a fragment, they are joined going each time to the nearest free end of another fragment (the distances to all the free ends are computed together with `Distances_From()`).
+
+# In[ ]:
+
+
+Greedy_No_Of_Neighbors = 10
+def Build_Greedy_Tour(nodes):
+    N = len(nodes)
+    if N < 3:
+        return list(nodes) + [nodes[0]]
+    neighbor = Build_Neighbors_Matrix(min(Greedy_No_Of_Neighbors, N-1), N)
+    cityOne = np.repeat(np.arange(1, N+1), len(neighbor[1]))
+    cityTwo = np.array(neighbor[1:]).ravel()
+    links = np.unique(np.minimum(cityOne, cityTwo) * (N+1) + np.maximum(cityOne, cityTwo)) # each link only once
+    cityOne, cityTwo = np.divmod(links, N+1)
+    lengths = Distances_Between(cityOne, cityTwo)
+    linked = [[] for city in range(N+1)]
+    fragmentOf = list(range(N+1))
+    def Fragment(city):
+        while fragmentOf[city] != city:
+            fragmentOf[city] = fragmentOf[fragmentOf[city]]
+            city = fragmentOf[city]
+        return city
+    numberOfLinks = 0
+    for link in np.argsort(lengths, kind="stable"): # with the same length, the links in the order of their cities
+        a, b = int(cityOne[link]), int(cityTwo[link])
+        if len(linked[a]) < 2 and len(linked[b]) < 2 and Fragment(a) != Fragment(b):
+            linked[a].append(b)
+            linked[b].append(a)
+            fragmentOf[Fragment(a)] = Fragment(b)
+            numberOfLinks += 1
+            if numberOfLinks == N-1:
+                break
+    ends = np.array([city for city in range(1, N+1) if len(linked[city]) < 2])
+    free = np.ones(len(ends), dtype=bool)
+    indexOfEnd = {int(city): index for index, city in enumerate(ends)}
+    tour = []
+    city = int(ends[0])
+    while True:
+        free[indexOfEnd[city]] = False
+        previous = 0
+        while True: # the fragment starting from city
+            tour.append(city)
+            following = [otherCity for otherCity in linked[city] if otherCity != previous]
+            if len(following) == 0:
+                break
+            previous, city = city, following[0]
+        free[indexOfEnd[city]] = False
+        if not free.any():
+            break
+        candidates = ends[free]
+        city = int(candidates[np.argmin(Distances_From(city, candidates))])
+    tour.append(tour[0])
+    return tour
+
+
+# # Build_Hilbert_Tour
+# Builds the tour visiting the cities in the order of a Hilbert space-filling curve over the plane: the coordinates are scaled on a grid of 2^`Hilbert_Order` x 2^`Hilbert_Order` cells, the position of each city along the curve is computed for all the cities together with `numpy`, and the cities are sorted by it, so it costs O(N log N).
+# <br>
+# Near cities are near on the curve, so the tour is not much longer than a nearest neighbor tour (about 25% more with random cities). If the problem has no coordinates, it uses `Build_Greedy_Tour()`.
+
+# In[ ]:
+
+
+Hilbert_Order = 16
+def Build_Hilbert_Tour(nodes):
+    if coordinates is None:
+        return Build_Greedy_Tour(nodes)
+    cities = np.array(nodes)
+    points = coordinates[cities, :2]
+    lowest = points.min(axis=0)
+    side = 2**Hilbert_Order
+    scale = (side - 1) / max((points.max(axis=0) - lowest).max(), 1e-12)
+    x, y = ((points - lowest) * scale).astype(np.int64).T
+    position = np.zeros(len(cities), dtype=np.int64)
+    s = side // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        position += s * s * ((3 * rx) ^ ry)
+        flip = ~ry & rx # rotation of the quadrant, so that the curve is continuous
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+        s //= 2
+    tour = cities[np.argsort(position, kind="stable")].tolist()
+    tour.append(tour[0])
+    return tour
+
+
+# # Distances_From
+# Returns the `numpy` array of the distances from `city` to each city of the array `cities`, read from `distanceMatrix` or computed from the coordinates together (see `Coordinates_Distances()`), or one at a time with `distance()` if there are no coordinates.
+# <br>
+# `Distances_Between()` does the same for the pairs of cities `cityOne[i]`, `cityTwo[i]`.
+
+# In[ ]:
+
+
+def Distances_From(city, cities):
+    return Distances_Between(np.full(len(cities), city), cities)
+
+def Distances_Between(cityOne, cityTwo):
+    if distanceMatrix is not None:
+        return distanceMatrix[cityOne, cityTwo].astype(np.int64)
+    if coordinates is not None:
+        return Coordinates_Distances(coordinates[cityOne], coordinates[cityTwo], problem.edge_weight_type)
+    return np.array([distance(int(a), int(b)) for a, b in zip(cityOne, cityTwo)], dtype=np.int64)
+
+
 # # Gain_From_2_Opt
 # Gain of tour length that can be obtained by performing given 2-opt move: it returns a positive number if it is convenient to perform a 2-opt move, a negative number otherwise, checking if the distance between `X1` and `X2` plus the distance between `Y1` and `Y2` is greater than the distance between `X1` and `Y1` plus the distance between `X2` and `Y2`.
 # <br>
@@ -100,27 +620,98 @@ def Build_Random_Tour(nodes):
 
 
 def Gain_From_2_Opt(X1, X2, Y1, Y2): 
-    global counter_call_Gain_From_2_Opt
     del_Length = distance(X1, X2) + distance(Y1, Y2)
     add_Length = distance(X1, Y1) + distance(X2, Y2)
     result = del_Length - add_Length
-    counter_call_Gain_From_2_Opt += 1 #to check how many times this function is called
+    if instrumentation:
+        counters["Gain_From_2_Opt"] += 1 #to check how many times this function is called
     return result
 
 
+# # Build_Position_Index
+# Builds the inverse of the `tour`: `pos[city]` is the index of `city` in the list `tour`, so that the searches with the Neighbor List can find where a neighbor is in the tour without calling `tour.index()` (that costs O(N)).
+# <br>
+# `pos[0]` is not used because there is no city with number 0.
+# <br>
+# The moves (`Reverse_Segment()`, `Make_2_Opt_Move()`, `Make_3_Opt_Move()` and `Make_Segment_Shift_Move()`) keep it updated if it is passed to them.
+
+# In[ ]:
+
+
+def Build_Position_Index(tour):
+    if isinstance(tour, array): # array-backed tour (see Build_Array_Tour()): the index is an array too, filled with numpy
+        pos = array('i', [0]) * (max(tour) + 1)
+        np.frombuffer(pos, dtype=np.intc)[np.frombuffer(tour, dtype=np.intc)] = np.arange(len(tour))
+        return pos
+    pos = [0] * (max(tour) + 1)
+    for index in range(len(tour)):
+        pos[tour[index]] = index
+    return pos
+
+
+# # Build_Array_Tour
+# Returns the `tour` as an `array('i')` of C integers: it is used like a list, but the segments can be reversed directly in its memory with `numpy` (see `Reverse_Segment()`).
+
+# In[ ]:
+
+
+from array import array
+def Build_Array_Tour(tour):
+    return array('i', tour)
+
+
 # # Reverse_Segment
 # Reverses order of elements in segment starting from startIndex and ending to endIndex of tour.
 # <br>
 # Final and initial part of tour make one segment.
 # <br>
 # While the order of arguments (`startIndex` and `endIndex`) can be safely changed when reversing segment in 2-optimization, it makes difference for 3-opt move: it isn't the same to reverse (x,z) and (z,x) in 3-opt.
+# <br>
+# If the position index `pos` (see `Build_Position_Index()`) is passed, it is updated for every city moved.
+# <br>
+# If `shorter` is True and the rest of the tour (from `endIndex+1` to `startIndex-1`) is shorter than the segment, it reverses the rest of the tour instead: the cyclic tour obtained is the same, only traversed in the opposite direction. In this case it returns True, because the positions of the cities are not the ones of the requested reversal (see `Reverse_Segments()`).
+# <br>
+# For an array-backed tour the segment is reversed in place with `numpy` (or with `Reverse_Segment_Kernel()` if `Use_JIT`, see `JIT_Kernels`); in a list, a segment that doesn't pass over the end of the list is reversed with a slice, the others swapping the cities one at a time.
+# <br>
+# If `reversalLog` is a list, the reversal is recorded in it by `Log_Reversal()`, so that `Undo_Reversals()` can undo all the moves done after a given point (see `Iterated_Local_Search()`).
 
 # In[ ]:
 
 
-def Reverse_Segment(tour, startIndex, endIndex):
+Min_Numpy_Reversal = 50
+noPositions = np.zeros(0, dtype=np.intc)
+reversalLog = None
+def Reverse_Segment(tour, startIndex, endIndex, pos = None, shorter = False):
+    if reversalLog is not None:
+        Log_Reversal(len(tour), startIndex, endIndex, shorter)
+    if Use_JIT and isinstance(tour, array) and (pos is None or isinstance(pos, array)) and Jit_Loaded(): # compiled reversal, see JIT_Kernels
+        positions = noPositions if pos is None else np.frombuffer(pos, dtype=np.intc)
+        return bool(Reverse_Segment_Kernel(np.frombuffer(tour, dtype=np.intc), positions, startIndex, endIndex, shorter))
     N = len(tour)
-    inversionSize = (int)(((N + endIndex - startIndex + 1) % N) / 2)
+    segmentLen = (N + endIndex - startIndex + 1) % N
+    reversedRest = shorter and 2 * segmentLen > N
+    if reversedRest:
+        startIndex, endIndex = (endIndex + 1) % N, (N + startIndex - 1) % N
+        segmentLen = N - segmentLen
+    if segmentLen >= Min_Numpy_Reversal and isinstance(tour, array) and (pos is None or isinstance(pos, array)):
+        cities = np.frombuffer(tour, dtype=np.intc)
+        if startIndex <= endIndex:
+            indices = slice(startIndex, endIndex+1)
+            positions = np.arange(startIndex, endIndex+1)
+        else: # the segment passes over the end of the array
+            positions = np.arange(startIndex, startIndex + segmentLen) % N
+            indices = positions
+        cities[indices] = cities[indices][::-1].copy()
+        if pos is not None:
+            np.frombuffer(pos, dtype=np.intc)[cities[indices]] = positions
+        return reversedRest
+    if startIndex <= endIndex and segmentLen > 1:
+        tour[startIndex:endIndex+1] = tour[startIndex:endIndex+1][::-1]
+        if pos is not None:
+            for index in range(startIndex, endIndex+1):
+                pos[tour[index]] = index
+        return reversedRest
+    inversionSize = (int)(segmentLen / 2)
     left  = startIndex
     right = endIndex
 
@@ -128,8 +719,57 @@ def Reverse_Segment(tour, startIndex, endIndex):
         aux = tour[left]
         tour[left] = tour[right]
         tour[right] = aux
+        if pos is not None:
+            pos[tour[left]] = left
+            pos[tour[right]] = right
         left  = (left + 1) % N
         right = (len(tour) + right - 1) % N
+    return reversedRest
+
+
+# # Undo_Reversals
+# `Log_Reversal()` appends to `reversalLog` the positions of the segment that `Reverse_Segment()` reverses (the rest of the tour, if it is reversed with `shorter`): reversing it again brings back the tour and the position index as they were. If the segment is the same of the last reversal recorded, the two reversals cancel each other and the last one is removed, as when a step of `One_City_LK()` is undone at once.
+# <br>
+# `Undo_Reversals()` reverses again the segments in the list `log`, from the last one, and empties it: the time is the one of the moves undone, not of the whole tour.
+
+# In[ ]:
+
+
+def Log_Reversal(N, startIndex, endIndex, shorter):
+    if shorter and 2 * ((N + endIndex - startIndex + 1) % N) > N:
+        startIndex, endIndex = (endIndex + 1) % N, (N + startIndex - 1) % N
+    if len(reversalLog) > 0 and reversalLog[-1] == (startIndex, endIndex):
+        reversalLog.pop()
+    else:
+        reversalLog.append((startIndex, endIndex))
+
+def Undo_Reversals(tour, log, pos = None):
+    global reversalLog
+    recording, reversalLog = reversalLog, None
+    for startIndex, endIndex in reversed(log):
+        Reverse_Segment(tour, startIndex, endIndex, pos)
+    log.clear()
+    reversalLog = recording
+
+
+# # Reverse_Segments
+# Reverses, one after the other, the `segments` of the tour (a list of couples `(startIndex, endIndex)`), as the 3-opt and the Segment Shift moves do, reversing each time the shorter side of the tour (see `Reverse_Segment()`).
+# <br>
+# The positions of the segments are the ones that the tour would have reversing always the requested segments. When the other side is reversed, the tour becomes the mirror of that one: the position `x` becomes `offset - x`; after another mirror it becomes a rotation `x + offset`. So the function keeps `sign` and `offset` and translates the positions of each following segment: the final tour is the requested one, possibly traversed in the opposite direction or starting from another position.
+
+# In[ ]:
+
+
+def Reverse_Segments(tour, segments, pos = None):
+    N = len(tour)
+    sign, offset = 1, 0 # the requested position x is now in the position (sign*x + offset) % N
+    for startIndex, endIndex in segments:
+        if sign == 1:
+            start, end = (startIndex + offset) % N, (endIndex + offset) % N
+        else:
+            start, end = (offset - endIndex) % N, (offset - startIndex) % N # in the mirror the segment goes in the opposite direction
+        if Reverse_Segment(tour, start, end, pos, shorter = True):
+            sign, offset = -sign, (start + end - offset) % N
 
 
 # # Make_2_Opt_Move
@@ -141,15 +781,17 @@ def Reverse_Segment(tour, startIndex, endIndex):
 # <br>
 # L1': from `t[i]` to `t[j]`   and  L2': from `t[i+1]` to `t[j+1]`
 # <br>
-# This is equivalent to reverse the order in segment from `i+1` to `j`
+# This is equivalent to reverse the order in segment from `i+1` to `j` (or the rest of the tour, if it is shorter)
+# <br>
+# `pos` is the optional position index of the tour, updated by the move.
 
 # In[ ]:
 
 
-def Make_2_Opt_Move(tour, i, j):
-    global counter_call_Make_2_Opt_Move
-    Reverse_Segment(tour, (i+1) % len(tour), j)
-    counter_call_Make_2_Opt_Move += 1 #to check how many times this function is called
+def Make_2_Opt_Move(tour, i, j, pos = None):
+    if instrumentation:
+        counters["Make_2_Opt_Move"] += 1 #to check how many times this function is called
+    Reverse_Segment(tour, (i+1) % len(tour), j, pos, shorter = True) # for a 2-opt move the direction of the tour doesn't matter
 
 
 # # One_City_2_Opt
@@ -160,14 +802,19 @@ def Make_2_Opt_Move(tour, i, j):
 # It is the basic version, without any speedup. 
 # <br>
 # The parameters passed to it are the list of cities, `tour`, the index `basePos` of the city that is used to search if there is a substitute better than its successor to decrease the total tour distance, the `improvement` chosen (First or Best taken).
+# <br>
+# If `Vectorized_Gains` is True and the `distanceMatrix` has been built, the gains are evaluated all together by `One_City_2_Opt_Vectorized()`, that finds the same move.
 
 # In[ ]:
 
 
+Vectorized_Gains = True
 def One_City_2_Opt(tour, basePos, improvement):
-    global counter_call_One_City_2_Opt # used to count how many times this function is called
-    counter_call_One_City_2_Opt += 1
-    improved = False
+    if instrumentation:
+        counters["One_City_2_Opt"] += 1 # used to count how many times this function is called
+    if Vectorized_Gains and distanceMatrix is not None:
+        return One_City_2_Opt_Vectorized(tour, basePos, improvement)
+    improved = 0
     if improvement == "Best":
         locallyOptimal = True
         bestMove = {"gain":0,"i":0,"j":0} # structure useful for the best improvement keeping trace of the last better gain and the positions of the cities in the tour giving that gain
@@ -191,7 +838,7 @@ def One_City_2_Opt(tour, basePos, improvement):
         if improvement == "First":
             if gainExpected > 0: 
                 Make_2_Opt_Move(tour, i, j)
-                improved = True
+                improved = gainExpected
                 return improved  # for the First Improvement, it has been found a better solution, so we break here the research
         else:
             if gainExpected > bestMove["gain"]: 
@@ -200,72 +847,229 @@ def One_City_2_Opt(tour, basePos, improvement):
     if improvement == "Best":
         if not locallyOptimal: # only out from the cycle, if it has been found a good solution with the Best Improvement, we use the best solution found 
             Make_2_Opt_Move(tour, bestMove["i"], bestMove["j"])
-            improved = True
+            improved = bestMove["gain"]
     return improved
 
 
+# # One_City_2_Opt_Vectorized
+# Same search of `One_City_2_Opt()`, but the gains of all the 2-opt moves of `basePos` are computed with `numpy` as arrays read from `distanceMatrix`, instead of calling `Gain_From_2_Opt()` for each `j`.
+# <br>
+# The moves are evaluated in tiles of `Vectorized_Tile_Size` values of `j`, so that with the First improvement it stops at the tile containing the first positive gain, and the memory used stays bounded.
+# <br>
+# With the First improvement it applies the first move with positive gain, with the Best improvement the first move with the maximal gain: the same moves chosen by `One_City_2_Opt()`. `counters["Gain_From_2_Opt"]` is increased by the number of gains that `One_City_2_Opt()` would have evaluated.
+
+# In[ ]:
+
+
+Vectorized_Tile_Size = 2**16
+def One_City_2_Opt_Vectorized(tour, basePos, improvement):
+    N = len(tour)
+    cities = np.array(tour)
+    i = basePos
+    X1 = cities[i]
+    X2 = cities[(i+1) % N]
+    if i == 0:
+        counter_2_Limit = N-1 #in this way we don't get in the cycle Y2 equal to X1
+    else:
+        counter_2_Limit = N
+    bestGain = 0
+    for firstJ in range(i+2, counter_2_Limit, Vectorized_Tile_Size):
+        j = np.arange(firstJ, min(firstJ + Vectorized_Tile_Size, counter_2_Limit))
+        Y1 = cities[j]
+        Y2 = cities[(j+1) % N]
+        gains = distanceMatrix[X1, X2] + distanceMatrix[Y1, Y2] - distanceMatrix[X1, Y1] - distanceMatrix[X2, Y2]
+        if improvement == "First":
+            positive = np.flatnonzero(gains > 0)
+            if len(positive) > 0:
+                if instrumentation:
+                    counters["Gain_From_2_Opt"] += int(positive[0]) + 1
+                Make_2_Opt_Move(tour, i, int(j[positive[0]]))
+                return int(gains[positive[0]])
+            if instrumentation:
+                counters["Gain_From_2_Opt"] += len(j)
+        else:
+            if instrumentation:
+                counters["Gain_From_2_Opt"] += len(j)
+            best = int(np.argmax(gains)) # the first of the maximal gains, as in One_City_2_Opt()
+            if gains[best] > bestGain:
+                bestGain = int(gains[best])
+                bestJ = int(j[best])
+    if improvement == "Best" and bestGain > 0:
+        Make_2_Opt_Move(tour, i, bestJ)
+        return bestGain
+    return 0
+
+
 # # LS_2_Opt_NoSpeedup
 # Optimizes the given tour using 2-opt without speedup.
 # <br>
 # While it can be found an improvement, the function try to do the 2-opt move starting from the city called basePos and the cities after it.
 # <br>
 # The city called `basePos` goes from the first one of the tour till the last one minus one, because the last one hasn't followers, so it is useless.
+# <br>
+# `timeLimit` and `moveLimit` are the budget of the search (see `Search_Budget`): when it is over, the search stops and returns the current tour.
 
 # In[ ]:
 
 
-def LS_2_Opt_NoSpeedup(tour,improvement):
+def LS_2_Opt_NoSpeedup(tour,improvement, timeLimit = None, moveLimit = None):
+    Start_Search(tour, timeLimit, moveLimit)
     del tour[len(tour)-1]
     N = len(tour)
     locallyOptimal = False
     
-    while not locallyOptimal:
+    while not locallyOptimal and not searchStatus["exhausted"]:
         locallyOptimal = True
-        for basePos in range(0,N-2):
-            improved = One_City_2_Opt(tour, basePos, improvement)
-            if improved:
-                locallyOptimal = False
+        with Timed("LS_sweep"):
+            for basePos in range(0,N-2):
+                if Budget_Exhausted():
+                    break
+                improved = One_City_2_Opt(tour, basePos, improvement)
+                if improved:
+                    locallyOptimal = False
+                    Track_Move(tour, improved)
     tour.append(tour[0])
     return tour
 
 
-# # sortSecond
-# Used to sort the list of neighbors depending on the distance.
+# # Build_Neighbors_Matrix
+# Builds lists of `No_Of_Neighbors` nearest neighbors of each city.
+# <br>
+# `neighbor[i][j]` is the j-th nearest neighbour of city number `i`.
+# <br>
+# The neighbors are searched with `Nearest_Neighbors_Grid()` when the problem has planar coordinates, otherwise with `Nearest_Neighbors_Partial()`: both give the same lists that would be obtained sorting all the distances of each city (with the same distance, the city with the lower number comes first), without building and sorting all of them.
 # <br>
-# `val` is an element of the list of neighbors with two elements: the first one is the number of the city and the second one is its distance from a certain node to which we are finding its closest neighbors.
+# If the global `sharedNeighbors` (the matrix of the nearest neighbors as a `numpy` array, see `solveTSP_MultiStart()` and `Preprocessing_Cache`) has at least `No_Of_Neighbors` columns, its first columns are used instead. With the cache, the neighbors are built with at least `Cache_Min_Neighbors` columns and saved, and they become `sharedNeighbors`.
 
 # In[ ]:
 
 
-def sortSecond(val): 
-    return val[1] 
+def Build_Neighbors_Matrix(No_Of_Neighbors,N):
+    global sharedNeighbors
+    with Timed("Build_Neighbors_Matrix"):
+        if sharedNeighbors is not None and len(sharedNeighbors) == N+1 and sharedNeighbors.shape[1] >= No_Of_Neighbors:
+            nearest = sharedNeighbors[:, :No_Of_Neighbors] # already computed, with at least as many neighbors
+        elif No_Of_Neighbors == 0:
+            nearest = np.zeros((N+1, 0), dtype=np.int32)
+        else:
+            width = No_Of_Neighbors if problemKey is None else min(max(No_Of_Neighbors, Cache_Min_Neighbors), N-1)
+            if coordinates is not None and problem.edge_weight_type in ["EUC_2D", "CEIL_2D", "ATT"]:
+                nearest = Nearest_Neighbors_Grid(width, coordinates, problem.edge_weight_type)
+            else:
+                nearest = Nearest_Neighbors_Partial(width, N)
+            if problemKey is not None:
+                sharedNeighbors = Save_Cached("neighbors", nearest.astype(np.int32))
+            nearest = nearest[:, :No_Of_Neighbors]
+        neighbor = nearest.tolist() # lists of python integers are faster to read in the searches than a numpy array
+        neighbor[0] = "EMPTY ROW" # the first row is empty and not used because there is no city with number 0. The cities start from 1.
+        return neighbor
 
 
-# # Build_Neighbors_Matrix
-# Builds lists of `No_Of_Neighbors` nearest neighbors of each city.
+# # Max_Coordinates_Distance
+# Given the rounded distances `rounded` (as computed by `Coordinates_Distances()`), returns the maximum euclidean distance between the coordinates that can give them, following the rounding rule of `weightType`.
 # <br>
-# `neighbor[i][j]` is the j-th nearest neighbour of city number `i`.
+# It is used by `Nearest_Neighbors_Grid()` to know how far it has to search.
 
 # In[ ]:
 
 
-def Build_Neighbors_Matrix(No_Of_Neighbors,N):
-    neighbor = [] #matrix
-    neighbor.append("EMPTY ROW") # the first row is empty and not used because there is no city with number 0. The cities start from 1.
-    for currentCity in range(1,N+1):
-        neighbors_of_currentCity_with_distance = []
-        # create the list of all neighbors of currentCity:
-        for otherCity in range(1,N+1):
-            if otherCity != currentCity:
-                neighbors_of_currentCity_with_distance.append([otherCity, distance(currentCity,otherCity)])
-                # Sort elements in neighbors_of_currentCity by ascending distance 
-        neighbors_of_currentCity_with_distance.sort(key=sortSecond, reverse = False)
-        neighbors_of_currentCity_with_distance = neighbors_of_currentCity_with_distance[0:No_Of_Neighbors]
-        neighbors_of_currentCity = []
-        for i in neighbors_of_currentCity_with_distance:
-            neighbors_of_currentCity.append(i[0]) #it mantains only the neighbors, not the distances, useful only for ordering the neighbors
-        neighbor.append(neighbors_of_currentCity)
-    return neighbor
+def Max_Coordinates_Distance(rounded, weightType):
+    if weightType == "ATT":
+        return rounded * np.sqrt(10)
+    if weightType == "CEIL_2D":
+        return rounded.astype(float)
+    return rounded + 0.5 # EUC_2D
+
+
+# # Nearest_Neighbors_Grid
+# Finds the `K` nearest neighbors of each city with a uniform grid over the plane, with about two cities in each cell.
+# <br>
+# All the cities of a cell are processed together: the candidates are the cities in the square of cells at distance `r` around it, and `r` grows until the square surely contains all the cities that could be among the `K` nearest ones (the ones nearer than `Max_Coordinates_Distance()` of the `K`-th candidate). So, each city looks only at the cities around it, instead of at all the N cities.
+# <br>
+# It returns a `numpy` array: `nearest[city]` is the list of the `K` nearest neighbors of `city`, the row 0 is not used.
+
+# In[ ]:
+
+
+def Nearest_Neighbors_Grid(K, coords, weightType):
+    N = len(coords) - 1
+    points = coords[1:]
+    lowest = points.min(axis=0)
+    cellsPerSide = max(1, int(np.sqrt(N / 2)))
+    cellSize = max((points.max(axis=0) - lowest).max(), 1) / cellsPerSide * (1 + 1e-9) # a bit larger, so that the farthest city stays in the last cell
+    cellX, cellY = np.minimum(((points - lowest) // cellSize).astype(np.int64), cellsPerSide - 1).T
+    cellOf = cellX * cellsPerSide + cellY
+    order = np.argsort(cellOf, kind="stable") + 1 # cities sorted by cell: the cities of a cell are contiguous
+    cellStart = np.searchsorted(cellOf[order - 1], np.arange(cellsPerSide * cellsPerSide + 1))
+    nearest = np.zeros((N+1, K), dtype=np.int32)
+    for cell in range(cellsPerSide * cellsPerSide):
+        members = order[cellStart[cell]:cellStart[cell+1]]
+        if len(members) == 0:
+            continue
+        x, y = divmod(cell, cellsPerSide)
+        r = 1
+        while True:
+            lowY, highY = max(0, y - r), min(cellsPerSide - 1, y + r)
+            candidates = np.concatenate([order[cellStart[cx * cellsPerSide + lowY]:cellStart[cx * cellsPerSide + highY + 1]]
+                                         for cx in range(max(0, x - r), min(cellsPerSide - 1, x + r) + 1)])
+            coversAll = r >= cellsPerSide
+            if len(candidates) > K or coversAll:
+                candidates.sort() # with the same distance, the city with the lower number comes first
+                rounded = Coordinates_Distances(coords[members, np.newaxis, :], coords[np.newaxis, candidates, :], weightType)
+                rounded[members[:, np.newaxis] == candidates[np.newaxis, :]] = np.iinfo(np.int64).max # a city isn't a neighbor of itself
+                kth = np.partition(rounded, K-1, axis=1)[:, K-1]
+                if coversAll or (Max_Coordinates_Distance(kth, weightType) <= r * cellSize).all():
+                    break
+            r += 1
+        nearest[members] = candidates[np.argsort(rounded, axis=1, kind="stable")[:, :K]]
+    return nearest
+
+
+# # Nearest_Neighbors_Partial
+# Finds the `K` nearest neighbors of each city when the grid can't be used (explicit matrices, GEO and the other types of distances).
+# <br>
+# For each city, the row of its distances (read from `distanceMatrix`, or computed if it hasn't been built) is only partially ordered with `numpy.partition` to find the distance of the `K`-th neighbor, and only the cities not farther than it are sorted.
+
+# In[ ]:
+
+
+def Nearest_Neighbors_Partial(K, N):
+    nearest = np.zeros((N+1, K), dtype=np.int32)
+    for city in range(1, N+1):
+        if distanceMatrix is not None:
+            row = distanceMatrix[city, 1:].astype(np.int64)
+        elif coordinates is not None:
+            row = Coordinates_Distances(coordinates[city], coordinates[1:], problem.edge_weight_type)
+        else:
+            row = np.array([distance(city, otherCity) for otherCity in range(1, N+1)], dtype=np.int64)
+        row[city - 1] = np.iinfo(np.int64).max # a city isn't a neighbor of itself
+        kth = np.partition(row, K-1)[K-1]
+        candidates = np.flatnonzero(row <= kth)
+        nearest[city] = candidates[np.argsort(row[candidates], kind="stable")[:K]] + 1
+    return nearest
+
+
+# # DontLookBits
+# The don't look bits of the cities (a dictionary: `DontLook[city]` is True if the DLB of `city` is on) together with the FIFO queue `active` of the cities still to be searched, the ones whose bit has been turned off and that have not been searched since. `queued` is the set of the cities in `active`.
+# <br>
+# At the start all the bits are off and all the `cities` are in the queue, in their order. `Set_DLB_off()` puts back in the queue the cities touched by a move, `Next_Active_City()` takes the first one (`active_cities` in the instrumentation), and the search ends when the queue is empty (see `LS_Active_Cities()`): near the local optimum only the cities touched by the last moves are searched again, without going over all the N cities to skip the ones with the bit on.
+
+# In[ ]:
+
+
+from collections import deque
+class DontLookBits(dict):
+    def __init__(self, cities):
+        super().__init__((city, False) for city in cities)
+        self.active = deque(self)
+        self.queued = set(self)
+
+def Next_Active_City(DontLook):
+    if instrumentation:
+        counters["active_cities"] += 1
+    city = DontLook.active.popleft()
+    DontLook.queued.discard(city)
+    return city
 
 
 # # isDLB_on
@@ -275,6 +1079,8 @@ def Build_Neighbors_Matrix(No_Of_Neighbors,N):
 
 
 def isDLB_on(DontLook, city):
+    if instrumentation and DontLook[city]:
+        counters["DLB_skips"] += 1
     return DontLook[city] #return True or False
 
 
@@ -289,15 +1095,39 @@ def Set_DLB_on(DontLook, city):
 
 
 # # Set_DLB_off
-# Turns off the DLB for all the cities passed inside a list passed as parameter
+# Turns off the DLB for all the cities passed inside a list passed as parameter, and puts them at the end of the queue of the cities to search (see `DontLookBits`) if they are not already in it
 
 # In[ ]:
 
 
 def Set_DLB_off(DontLook, cities):
   # turns off DLB for given cities
-    for city in range(0,len(cities)):
-        DontLook[cities[city]] = False
+    for city in cities:
+        DontLook[city] = False
+        if city not in DontLook.queued:
+            DontLook.queued.add(city)
+            DontLook.active.append(city)
+
+
+# # LS_Active_Cities
+# Local search loop with DLB, used by all the local searches with the DLB speedup: it takes the cities from the queue of `DontLook` (see `DontLookBits`) and searches an improving move from each of them with `searchFromCity(baseCity)`, that returns the gain of the move applied (0 if none), until the queue is empty or the budget is exhausted (see `Budget_Exhausted()`).
+# <br>
+# If there is no move from `baseCity` its DLB is turned on, otherwise the city goes back in the queue, with the cities touched by the move. The `tour` is passed only to `Track_Move()`.
+
+# In[ ]:
+
+
+def LS_Active_Cities(tour, DontLook, searchFromCity):
+    with Timed("LS_queue"):
+        searchStatus["DontLook"] = DontLook
+        while DontLook.active and not Budget_Exhausted():
+            baseCity = Next_Active_City(DontLook)
+            improved = searchFromCity(baseCity)
+            if not improved:
+                Set_DLB_on(DontLook, baseCity)
+            else:
+                Set_DLB_off(DontLook, [baseCity])
+                Track_Move(tour, improved)
 
 
 # # One_City_2_Opt_DR
@@ -318,7 +1148,7 @@ def Set_DLB_off(DontLook, cities):
 
 def One_City_2_Opt_DR(tour, basePos, DontLook, improvement, speedup, Fraction_Radius):
     N = len(tour)
-    improved = False
+    improved = 0
     if improvement == "Best":
         locallyOptimal = True
         if "DLB" in speedup: 
@@ -364,7 +1194,7 @@ def One_City_2_Opt_DR(tour, basePos, DontLook, improvement, speedup, Fraction_Ra
                     if "DLB" in speedup:
                         Set_DLB_off(DontLook, [X1, X2, Y1, Y2])
                     Make_2_Opt_Move(tour, i, j)
-                    improved = True
+                    improved = gainExpected
                     return improved
             else:
                 if gainExpected > bestMove["gain"]: #if it is greater than zero!
@@ -378,7 +1208,7 @@ def One_City_2_Opt_DR(tour, basePos, DontLook, improvement, speedup, Fraction_Ra
             if "DLB" in speedup:
                 Set_DLB_off(DontLook, [bestMove["X1"], bestMove["X2"], bestMove["Y1"], bestMove["Y2"]])
             Make_2_Opt_Move(tour, bestMove["i"], bestMove["j"])
-            improved = True
+            improved = bestMove["gain"]
     return improved
 
 
@@ -395,15 +1225,20 @@ def One_City_2_Opt_DR(tour, basePos, DontLook, improvement, speedup, Fraction_Ra
 # <br>
 # The parameter `numberOfNeigbors` is the length of the rows of the matrix neighbor.
 # <br>
+# The parameter `pos` is the position index of the tour (see `Build_Position_Index()`), used to find in O(1) where the neighbors are in the tour.
+# <br>
 # The other parameters are the same of `One_City_2_Opt()` and `One_City_2_Opt_DR()`.
+# <br>
+# On an array-backed tour with the `distanceMatrix`, if `Use_JIT` the search is done by `One_City_2_Opt_JIT()` (see `JIT_Kernels`).
 
 # In[ ]:
 
 
-def One_City_2_Opt_NDR(tour, basePos, neighbor, numberOfNeigbors, DontLook, improvement, speedup, Fraction_Radius):
-
+def One_City_2_Opt_NDR(tour, basePos, neighbor, numberOfNeigbors, DontLook, improvement, speedup, Fraction_Radius, pos):
+    if Jit_Ready(tour, pos):
+        return One_City_2_Opt_JIT(tour, basePos, neighbor, numberOfNeigbors, DontLook, improvement, speedup, Fraction_Radius, pos)
     N = len(tour)
-    improved = False
+    improved = 0
     if improvement == "Best":
         locallyOptimal = True
         if "DLB" in speedup:
@@ -425,10 +1260,10 @@ def One_City_2_Opt_NDR(tour, basePos, neighbor, numberOfNeigbors, DontLook, impr
         for neighbor_number in range(0, numberOfNeigbors): #this is the part that changes using NeighborList. It isn't compactable because the final part, that is equal even without the NeighborList, is still inside the cycle for
             Y1 = neighbor[X1][neighbor_number]
             if direction == "forward":
-                j = tour.index(Y1)
+                j = pos[Y1]
                 Y2 = tour[(j+1) % N]
             else:
-                j  = (N + tour.index(Y1) - 1) % N  # pos[Y1] == j+1
+                j  = (N + pos[Y1] - 1) % N  # pos[Y1] == j+1
                 Y2 = tour[j]
 
             if (X2 == Y1) or (Y2 == X1):
@@ -442,8 +1277,8 @@ def One_City_2_Opt_NDR(tour, basePos, neighbor, numberOfNeigbors, DontLook, impr
                 if gainExpected > 0:
                     if "DLB" in speedup:
                         Set_DLB_off(DontLook, [X1, X2, Y1, Y2])
-                    Make_2_Opt_Move(tour, i, j)
-                    improved = True
+                    Make_2_Opt_Move(tour, i, j, pos)
+                    improved = gainExpected
                     return improved
             else:
                 if gainExpected > bestMove["gain"]:
@@ -456,54 +1291,65 @@ def One_City_2_Opt_NDR(tour, basePos, neighbor, numberOfNeigbors, DontLook, impr
         if not locallyOptimal:
             if "DLB" in speedup:
                 Set_DLB_off(DontLook, [bestMove["X1"], bestMove["X2"], bestMove["Y1"], bestMove["Y2"]])
-            Make_2_Opt_Move(tour, bestMove["i"], bestMove["j"])
-            improved = True
+            Make_2_Opt_Move(tour, bestMove["i"], bestMove["j"], pos)
+            improved = bestMove["gain"]
     return improved
 
 
 # # LS_2_Opt
 # Optimizes the given tour using 2-opt with speedup.
 # <br>
-# While it can be found an improvement, the function try to do the 2-opt move starting from the city `basePos` and the cities after it.
+# While it can be found an improvement, the function try to do the 2-opt move starting from the city `basePos` and the cities after it. With DLB, the cities to start from are taken from the queue of the active cities instead (see `LS_Active_Cities()`), also in `LS_3_Opt()`, `LS_Or_Opt()` and `LS_LK()`.
 # <br>
 # The parameters `No_Of_Neigbors` and `Fraction_Radius`, if not passed, are setted with their default values.
+# <br>
+# `representation` is the representation of the tour used by the search: "array" (the list or array of the cities, see `Build_Array_Tour()`) or "TwoLevel" (see `TwoLevelTour`, for the instances with very many cities).
+# <br>
+# `timeLimit` and `moveLimit` are the budget of the search, as in `LS_2_Opt_NoSpeedup()`.
 
 # In[ ]:
 
 
-def LS_2_Opt(tour,improvement, speedup, No_Of_Neigbors = False, Fraction_Radius = 1):
+def LS_2_Opt(tour,improvement, speedup, No_Of_Neigbors = False, Fraction_Radius = 1, representation = "array", timeLimit = None, moveLimit = None):
+    Start_Search(tour, timeLimit, moveLimit)
     del tour[len(tour)-1]
     N = len(tour)
     locallyOptimal = False
+    neighbor = False
+    neighborListLen = N-1
     if "NeighborList" in speedup:
         if No_Of_Neigbors == False:
             No_Of_Neigbors = (int)(len(tour)/10)
         neighborListLen = min(No_Of_Neigbors, len(tour)-1)#neighbors mustn't exceed the number of cities in the tour
         neighbor = Build_Neighbors_Matrix(neighborListLen,N)#neighbor is the matrix of the neighbors
+        pos = Build_Position_Index(tour) #position of each city in the tour, updated by the moves
     if "DLB" in speedup:
-        DontLook = {} #it is a dictionary where the key is the city and the value is True or False
-        for i in range(1,len(tour)+1):
-            DontLook[i] = False#set DLB off
+        DontLook = DontLookBits(tour) #the bits of the cities, with the queue of the cities to search
     else:
         DontLook = False #if we don't use DLB we don't need any structure for it, but we have in any case something to pass as DontLook to the function (because it consider either the cases with and without DLB to be more compact)
+    if representation == "TwoLevel":
+        LS_Two_Level(tour, One_City_2_Opt_TwoLevel, improvement, speedup, neighbor, neighborListLen, DontLook, Fraction_Radius)
+        locallyOptimal = True
+    elif "DLB" in speedup: # only the cities in the queue are searched
+        if "NeighborList" in speedup:
+            LS_Active_Cities(tour, DontLook, lambda baseCity: One_City_2_Opt_NDR(tour, pos[baseCity], neighbor, neighborListLen, DontLook, improvement, speedup, Fraction_Radius, pos))
+        else: # without Neighbor List the search from a city is O(N) anyway, so also its position is looked for in the tour
+            LS_Active_Cities(tour, DontLook, lambda baseCity: One_City_2_Opt_DR(tour, tour.index(baseCity), DontLook, improvement, speedup, Fraction_Radius))
+        locallyOptimal = True
   
-    while not locallyOptimal:
+    while not locallyOptimal and not searchStatus["exhausted"]:
         locallyOptimal = True
-        for basePos in range(0,N):
-            if "DLB" in speedup:
-                baseCity = tour[basePos]
-                if isDLB_on(DontLook, baseCity):
-                    continue
-            if "NeighborList" in speedup: # here there are all the possible cases in which there is NeighborList
-                improved = One_City_2_Opt_NDR(tour, basePos, neighbor, neighborListLen, DontLook, improvement, speedup, Fraction_Radius)
-            else: # here there are the other cases with speedup but without NeighborList
-                improved = One_City_2_Opt_DR(tour, basePos, DontLook, improvement, speedup, Fraction_Radius)
-                
-            if not improved:
-                if "DLB" in speedup: 
-                    Set_DLB_on(DontLook, baseCity)
-            else:
-                locallyOptimal = False
+        with Timed("LS_sweep"):
+            for basePos in range(0,N):
+                if Budget_Exhausted():
+                    break
+                if "NeighborList" in speedup: # here there are all the possible cases in which there is NeighborList
+                    improved = One_City_2_Opt_NDR(tour, basePos, neighbor, neighborListLen, DontLook, improvement, speedup, Fraction_Radius, pos)
+                else: # here there are the other cases with speedup but without NeighborList
+                    improved = One_City_2_Opt_DR(tour, basePos, DontLook, improvement, speedup, Fraction_Radius)
+                if improved:
+                    locallyOptimal = False
+                    Track_Move(tour, improved)
     tour.append(tour[0])
     return tour
 
@@ -511,6 +1357,8 @@ def LS_2_Opt(tour,improvement, speedup, No_Of_Neigbors = False, Fraction_Radius
 # # Between
 # Returns true if `x` is between `a` and `b` in cyclic sequence of the tour.
 # <br>
+# `a`, `x` and `b` are positions in the tour: with the Neighbor List they are read from the position index `pos`.
+# <br>
 # It is used if used the 3-opt method.
 
 # In[ ]:
@@ -523,6 +1371,7 @@ def Between(a, x, b):
         result = (x > a) or (x < b)
     else:
         result = False
+    return result
 
 
 # # Gain_From_3_Opt
@@ -546,6 +1395,8 @@ def Between(a, x, b):
 
 
 def Gain_From_3_Opt(X1, X2, Y1, Y2, Z1, Z2, optCase):
+    if instrumentation:
+        counters["Gain_From_3_Opt"] += 1
     if optCase == "opt3_case_0":
         return 0  # original tour remains without changes
 
@@ -596,11 +1447,15 @@ def Gain_From_3_Opt(X1, X2, Y1, Y2, Z1, Z2, optCase):
 # segment `c` = `[j+1 .. k]`
 # <br>
 # `a'` means reversed segment `a`, same thing for `b'` and `c'`
+# <br>
+# `pos` is the optional position index of the tour, updated by the move.
 
 # In[ ]:
 
 
-def Make_3_Opt_Move(tour,i, j, k, optCase):
+def Make_3_Opt_Move(tour,i, j, k, optCase, pos = None):
+    if instrumentation:
+        counters["Make_3_Opt_Move"] += 1
     N = len(tour)
   # IDENTITY
   #   nothing to do, the tour remains without changes
@@ -610,76 +1465,78 @@ def Make_3_Opt_Move(tour,i, j, k, optCase):
   # 2-OPT MOVES
   #   one of the three links is removed and added again
     elif optCase == "opt3_case_1":#  a'bc = a[bc]'
-        Reverse_Segment(tour, (k+1) % N, i)
+        Reverse_Segment(tour, (k+1) % N, i, pos, shorter = True)
     elif optCase == "opt3_case_2":    #  abc'
-        Reverse_Segment(tour, (j+1) % N, k)
+        Reverse_Segment(tour, (j+1) % N, k, pos, shorter = True)
     elif optCase == "opt3_case_3":    #  ab'c
-        Reverse_Segment(tour, (i+1) % N, j)
+        Reverse_Segment(tour, (i+1) % N, j, pos, shorter = True)
 
-      # PURE 3-OPT MOVES
-      #   all three links are removed, then other links between cities added
-      #   A) moves equal to two subsequent 2-opt moves:
+  # PURE 3-OPT MOVES
+  #   all three links are removed, then other links between cities added
+  #   A) moves equal to two subsequent 2-opt moves:
     elif optCase == "opt3_case_4":    # ab'c'
-        Reverse_Segment(tour, (j+1) % N, k)
-        Reverse_Segment(tour, (i+1) % N, j)
+        Reverse_Segments(tour, [((j+1) % N, k), ((i+1) % N, j)], pos)
     elif optCase == "opt3_case_5":    # a'b'c
-        Reverse_Segment(tour, (k+1) % N, i)
-        Reverse_Segment(tour, (i+1) % N, j)
+        Reverse_Segments(tour, [((k+1) % N, i), ((i+1) % N, j)], pos)
     elif optCase == "opt3_case_6":    # a'bc'
-        Reverse_Segment(tour, (k+1) % N, i)
-        Reverse_Segment(tour, (j+1) % N, k)
-      #   B) move equal to three subsequent 2-opt moves
+        Reverse_Segments(tour, [((k+1) % N, i), ((j+1) % N, k)], pos)
+  #   B) move equal to three subsequent 2-opt moves
     elif optCase == "opt3_case_7":    # a'b'c' (=acb)
         # this move can be implemented by reversing all segments
         # without changing their order (a'b'c'), that is as a sequence
         # of three 2-opt moves:
-        Reverse_Segment(tour, (k+1) % N, i)
-        Reverse_Segment(tour, (i+1) % N, j)
-        Reverse_Segment(tour, (j+1) % N, k)
+        Reverse_Segments(tour, [((k+1) % N, i), ((i+1) % N, j), ((j+1) % N, k)], pos)
 
 
 # # LS_3_Opt
 # Optimizes the given tour using 3-opt with or without speedup (only cases with DLB and NeighborList+DLB).
 # <br>
 # The parameters have the same meaning of the ones in `LS_2_Opt()`.
+# <br>
+# With the "TwoLevel" `representation` all the speedups can be used.
 
 # In[2]:
 
 
-def LS_3_Opt(tour, improvement, speedup, No_Of_Neigbors = False): 
+def LS_3_Opt(tour, improvement, speedup, No_Of_Neigbors = False, representation = "array", timeLimit = None, moveLimit = None): 
+    Start_Search(tour, timeLimit, moveLimit)
     del tour[len(tour)-1]
     N = len(tour)
     locallyOptimal = False
+    neighbor = False
+    neighborListLen = N-1
     if "NeighborList" in speedup:
         if No_Of_Neigbors == False:
             No_Of_Neigbors = (int)(len(tour)/10)
         neighborListLen = min(No_Of_Neigbors, len(tour)-1)#neighbors mustn't exceed the number of cities in the tour
         neighbor = Build_Neighbors_Matrix(neighborListLen,N)#neighbor is the matrix of the neighbors
+        pos = Build_Position_Index(tour) #position of each city in the tour, updated by the moves
     
     if "DLB" in speedup:
-        DontLook = {} #it is a dictionary where the key is the city and the value is True or False
-        for i in range(1,len(tour)+1):
-            DontLook[i] = False#set DLB off
+        DontLook = DontLookBits(tour)
+    else:
+        DontLook = False
+    if representation == "TwoLevel":
+        LS_Two_Level(tour, One_City_3_Opt_TwoLevel, improvement, speedup, neighbor, neighborListLen, DontLook, 1)
+        locallyOptimal = True
+    elif "NeighborList+DLB" in speedup: # here there is the call to the function depending on the speedup used
+        LS_Active_Cities(tour, DontLook, lambda baseCity: One_City_3_Opt_ND(tour, pos[baseCity], neighbor, neighborListLen, DontLook, improvement, pos))
+        locallyOptimal = True
+    elif "DLB" in speedup:
+        LS_Active_Cities(tour, DontLook, lambda baseCity: One_City_3_Opt_DLB(tour, tour.index(baseCity), DontLook, improvement))
+        locallyOptimal = True
   
-    while not locallyOptimal:
+    while not locallyOptimal and not searchStatus["exhausted"]:
         locallyOptimal = True
-        for basePos in range(0,N):
-            if "DLB" in speedup:
-                baseCity = tour[basePos]
-                if isDLB_on(DontLook, baseCity):
-                    continue
-                # here there is the call to the function depending on the speedup used
-            if "NeighborList+DLB" in speedup:
-                improved = One_City_3_Opt_ND(tour, basePos, neighbor, neighborListLen, DontLook, improvement)
-            elif "DLB" in speedup:
-                improved = One_City_3_Opt_DLB(tour, basePos, DontLook, improvement)
-            elif "False" in speedup:
-                improved = One_City_3_Opt(tour, basePos, improvement)
-            if not improved:
-                if "DLB" in speedup:
-                    Set_DLB_on(DontLook, baseCity)
-            else:
-                locallyOptimal = False
+        with Timed("LS_sweep"):
+            for basePos in range(0,N):
+                if Budget_Exhausted():
+                    break
+                if "False" in speedup:
+                    improved = One_City_3_Opt(tour, basePos, improvement)
+                if improved:
+                    locallyOptimal = False
+                    Track_Move(tour, improved)
     tour.append(tour[0])
     return tour
 
@@ -690,12 +1547,16 @@ def LS_3_Opt(tour, improvement, speedup, No_Of_Neigbors = False):
 # It is the basic version, without any speedup. 
 # <br>
 # The idea is the same used in `One_City_2_Opt()`, but taking into account another couple of cities, `Z1` and `Z2`, (obtained with another cycle for), to use `Gain_From_3_Opt()` and `Make_3_Opt_Move()`.
+# <br>
+# As in `One_City_2_Opt()`, if `Vectorized_Gains` is True and the `distanceMatrix` has been built, the gains are evaluated by `One_City_3_Opt_Vectorized()`.
 
 # In[ ]:
 
 
 def One_City_3_Opt(tour, basePos, improvement):
-    improved = False
+    if Vectorized_Gains and distanceMatrix is not None:
+        return One_City_3_Opt_Vectorized(tour, basePos, improvement)
+    improved = 0
     if improvement == "Best":
         locallyOptimal = True
         bestMove = {"gain":0,"i":0,"j":0,"k":0,"optCase":0} # it has to save also the optCase for which the gain is better than the last one, to understand how to do, at the end, the 3-opt move.
@@ -718,7 +1579,7 @@ def One_City_3_Opt(tour, basePos, improvement):
                 if improvement == "First":
                     if gainExpected > 0:
                         Make_3_Opt_Move(tour, i, j, k, optCase)
-                        improved = True
+                        improved = gainExpected
                         return improved
                 else:
                     if gainExpected > bestMove["gain"]:
@@ -727,10 +1588,74 @@ def One_City_3_Opt(tour, basePos, improvement):
     if improvement == "Best":
         if not locallyOptimal:
             Make_3_Opt_Move(tour, bestMove["i"], bestMove["j"], bestMove["k"], bestMove["optCase"])
-            improved = True
+            improved = bestMove["gain"]
     return improved
 
 
+# # One_City_3_Opt_Vectorized
+# Same search of `One_City_3_Opt()`, with the gains computed with `numpy` from `distanceMatrix`.
+# <br>
+# The tour is rotated so that `basePos` is in position 0: in this way `counter_2` and `counter_3` are directly the positions of `Y1` and `Z1`. The gains of the cases opt3_case_3, opt3_case_6 and opt3_case_7 are computed for a tile of rows `counter_2` and all the columns `counter_3`, with about `Vectorized_Tile_Size` moves in each tile.
+# <br>
+# The moves are considered in the same order of `One_City_3_Opt()` (`counter_2`, then `counter_3`, then the case), so the move applied is the same.
+
+# In[ ]:
+
+
+def One_City_3_Opt_Vectorized(tour, basePos, improvement):
+    N = len(tour)
+    if N < 4:
+        return 0
+    optCases = ["opt3_case_3", "opt3_case_6", "opt3_case_7"]
+    i = basePos
+    rotated = np.roll(np.array(tour), -i)
+    X1 = rotated[0]
+    X2 = rotated[1]
+    Z1 = rotated[np.newaxis, :] # columns: counter_3
+    Z2 = np.roll(rotated, -1)[np.newaxis, :]
+    d_X1_X2 = distanceMatrix[X1, X2]
+    d_Z1_Z2 = distanceMatrix[Z1, Z2]
+    d_Z1_X2 = distanceMatrix[Z1, X2]
+    d_X2_Z2 = distanceMatrix[X2, Z2]
+    rowsPerTile = max(1, Vectorized_Tile_Size // N)
+    bestGain = 0
+    for firstRow in range(1, N-2, rowsPerTile):
+        counter_2 = np.arange(firstRow, min(firstRow + rowsPerTile, N-2))[:, np.newaxis]
+        Y1 = rotated[counter_2]
+        Y2 = rotated[counter_2 + 1]
+        d_Y1_Y2 = distanceMatrix[Y1, Y2]
+        d_X1_Y2 = distanceMatrix[X1, Y2]
+        deleted = d_X1_X2 + d_Y1_Y2 + d_Z1_Z2
+        gains = np.empty((len(counter_2), N, 3), dtype=np.int64)
+        gains[:, :, 0] = d_X1_X2 + d_Y1_Y2 - distanceMatrix[X1, Y1] - distanceMatrix[X2, Y2]
+        gains[:, :, 1] = deleted - d_X1_Y2 - distanceMatrix[Z1, Y1] - d_X2_Z2
+        gains[:, :, 2] = deleted - d_X1_Y2 - d_Z1_X2 - distanceMatrix[Y1, Z2]
+        gains[np.arange(N)[np.newaxis, :] <= counter_2] = np.iinfo(np.int64).min # only counter_3 > counter_2
+        evaluated = 3 * (N - 1 - counter_2[:, 0]) # the gains of each row evaluated by One_City_3_Opt()
+        if improvement == "First":
+            positive = np.flatnonzero(gains > 0)
+            if len(positive) > 0:
+                row, counter_3, case = np.unravel_index(positive[0], gains.shape)
+                if instrumentation:
+                    counters["Gain_From_3_Opt"] += int(evaluated[:row].sum()) + 3 * (int(counter_3) - int(counter_2[row, 0]) - 1) + int(case) + 1
+                Make_3_Opt_Move(tour, i, (i + int(counter_2[row, 0])) % N, (i + int(counter_3)) % N, optCases[case])
+                return int(gains.flat[positive[0]])
+            if instrumentation:
+                counters["Gain_From_3_Opt"] += int(evaluated.sum())
+        else:
+            if instrumentation:
+                counters["Gain_From_3_Opt"] += int(evaluated.sum())
+            best = int(np.argmax(gains)) # the first of the maximal gains in the order of One_City_3_Opt()
+            if gains.flat[best] > bestGain:
+                bestGain = int(gains.flat[best])
+                row, counter_3, case = np.unravel_index(best, gains.shape)
+                bestMove = {"gain":bestGain,"i":i,"j":(i + int(counter_2[row, 0])) % N,"k":(i + int(counter_3)) % N,"optCase":optCases[case]}
+    if improvement == "Best" and bestGain > 0:
+        Make_3_Opt_Move(tour, bestMove["i"], bestMove["j"], bestMove["k"], bestMove["optCase"])
+        return bestGain
+    return 0
+
+
 # # One_City_3_Opt_DLB
 # Shortens the tour by repeating 3-opt moves until no improvement can be done.
 # <br>
@@ -741,7 +1666,7 @@ def One_City_3_Opt(tour, basePos, improvement):
 
 def One_City_3_Opt_DLB(tour, basePos, DontLook, improvement):
     N = len(tour)
-    improved = False
+    improved = 0
     if improvement == "Best":
         locallyOptimal = True
         bestMove = {"gain":0,"i":0,"j":0,"k":0,"optCase":0}
@@ -770,7 +1695,7 @@ def One_City_3_Opt_DLB(tour, basePos, DontLook, improvement):
                 if gainExpected > 0:
                     Set_DLB_off(DontLook, [X1, X2, Y1, Y2])
                     Make_3_Opt_Move(tour, i, j, j, "opt3_case_1")
-                    improved = True
+                    improved = gainExpected
                     return improved
             else:
                 if gainExpected > bestMove["gain"]:
@@ -791,7 +1716,7 @@ def One_City_3_Opt_DLB(tour, basePos, DontLook, improvement):
                     gainExpected = Gain_From_3_Opt(X1, X2, Y1, Y2, Z1, Z2, optCase)
                     if improvement == "First":
                         if gainExpected > 0:
-                            improved = True
+                            improved = gainExpected
                             Set_DLB_off(DontLook, [X1, X2, Y1, Y2, Z1, Z2])
                             Make_3_Opt_Move(tour, i, j, k, optCase)
                             return improved
@@ -800,11 +1725,12 @@ def One_City_3_Opt_DLB(tour, basePos, DontLook, improvement):
                             bestMove = {"gain":gainExpected,"i":i,"j":j,"k":k,"optCase":optCase}
                             locallyOptimal = False
     if improvement == "Best":
-        if notLocallyOptimal:
-            improved = True
-            Set_DLB_off(DontLook, [X1, X2, Y1, Y2])
-            if bestMove["optCase"] == "opt3_case_6" or bestMove["optCase"] == "opt3_case_7":
-                Set_DLB_off(DontLook, [Z1, Z2])
+        if not locallyOptimal:
+            improved = bestMove["gain"]
+            Set_DLB_off(DontLook,
+                          [ tour[bestMove["i"]], tour[(bestMove["i"] + 1) % N],
+                            tour[bestMove["j"]], tour[(bestMove["j"] + 1) % N],
+                            tour[bestMove["k"]], tour[(bestMove["k"] + 1) % N] ])
             Make_3_Opt_Move(tour, bestMove["i"], bestMove["j"], bestMove["k"], bestMove["optCase"])
     return improved
 
@@ -814,14 +1740,16 @@ def One_City_3_Opt_DLB(tour, basePos, DontLook, improvement):
 # <br>
 # This is the version using the NeighborList+DLB speedup, with some semplifications.
 # <br>
-# The parameters has the same meaning that they have in `One_City_2_Opt_NDR()`.
+# The parameters has the same meaning that they have in `One_City_2_Opt_NDR()`; as there, with First improvement the search can be done by `One_City_3_Opt_JIT()`.
 
 # In[ ]:
 
 
-def One_City_3_Opt_ND(tour, basePos, neighbor, numberOfNeigbors, DontLook, improvement):
+def One_City_3_Opt_ND(tour, basePos, neighbor, numberOfNeigbors, DontLook, improvement, pos):
+    if improvement == "First" and Jit_Ready(tour, pos):
+        return One_City_3_Opt_JIT(tour, basePos, neighbor, numberOfNeigbors, DontLook, pos)
     N = len(tour)
-    improved = False
+    improved = 0
     if improvement == "Best":
         locallyOptimal = True
         bestMove = {"gain":0,"i":0,"j":0,"k":0,"optCase":0}
@@ -838,39 +1766,39 @@ def One_City_3_Opt_ND(tour, basePos, neighbor, numberOfNeigbors, DontLook, impro
         # new edges in optCase=6: *X1-Y2*, Y1-Z1, X2-Z2
         # new edges in optCase=7: *X1-Y2*, X2-Z1, Y1-Z2
             Y2 = neighbor[X1][neighbor_1]
-            j  = (tour.index(Y2) + N - 1) % N
+            j  = (pos[Y2] + N - 1) % N
             Y1 = tour[j]
 
             if (Y1 != X1) and (Y1 != X2):
                 gainExpected = Gain_From_2_Opt(X1, X2, Y1, Y2)
                 if improvement == "First":
                     if gainExpected > 0:
-                        improved = True
+                        improved = gainExpected
                         Set_DLB_off(DontLook, [X1, X2, Y1, Y2])
-                        Make_3_Opt_Move(tour, i, j, j, "opt3_case_1")
+                        Make_3_Opt_Move(tour, i, j, j, "opt3_case_1", pos)
                         return improved
                 else:
                     if gainExpected > bestMove["gain"]:
-                        locallyOptimal = True
+                        locallyOptimal = False
                         bestMove = {"gain":gainExpected,"i":i,"j":j,"k":j,"optCase":"opt3_case_1"}
 
             for neighbor_2 in range(0, numberOfNeigbors):
               # new edges in optCase=6: X1-Y2, *Y1-Z1*, X2-Z2
                 Z1_6 = neighbor[Y1][neighbor_2]
-                k_6  = tour.index(Z1_6)
+                k_6  = pos[Z1_6]
                 Z2_6 = tour[(k_6 + 1) % N]
               # new edges in optCase=7: X1-Y2, X2-Z1, *Y1-Z2*
                 Z2_7 = neighbor[Y1][neighbor_2]
-                k_7  = (tour.index(Z2_7) + N - 1) % N
+                k_7  = (pos[Z2_7] + N - 1) % N
                 Z1_7 = tour[k_7]
 
                 if Between(i, j, k_6):
                     gainExpected = Gain_From_3_Opt(X1, X2, Y1, Y2, Z1_6, Z2_6,"opt3_case_6")
                     if improvement == "First":
                         if gainExpected > 0:
-                            improved = True
+                            improved = gainExpected
                             Set_DLB_off(DontLook, [X1, X2, Y1, Y2, Z1_6, Z2_6])
-                            Make_3_Opt_Move(tour, i, j, k_6, "opt3_case_6")
+                            Make_3_Opt_Move(tour, i, j, k_6, "opt3_case_6", pos)
                             return improved
                     else:
                         if gainExpected > bestMove["gain"]:
@@ -881,26 +1809,219 @@ def One_City_3_Opt_ND(tour, basePos, neighbor, numberOfNeigbors, DontLook, impro
                     gainExpected = Gain_From_3_Opt(X1, X2, Y1, Y2, Z1_7, Z2_7,"opt3_case_7")
                     if improvement == "First":
                         if gainExpected > 0:
-                            improved = True
+                            improved = gainExpected
                             Set_DLB_off(DontLook, [X1, X2, Y1, Y2, Z1_7, Z2_7])
-                            Make_3_Opt_Move(tour, i, j, k_7, "opt3_case_7")
+                            Make_3_Opt_Move(tour, i, j, k_7, "opt3_case_7", pos)
                             return improved
                     else:
                         if gainExpected > bestMove["gain"]:
                             locallyOptimal = False
                             bestMove = {"gain":gainExpected,"i":i,"j":j,"k":k_7,"optCase":"opt3_case_7"}
     if improvement == "Best":
-        if notLocallyOptimal:
-            improved = True
+        if not locallyOptimal:
+            improved = bestMove["gain"]
             Set_DLB_off(DontLook,
                           [ tour[bestMove["i"]], tour[(bestMove["i"] + 1) % N],
                             tour[bestMove["j"]], tour[(bestMove["j"] + 1) % N],
                             tour[bestMove["k"]], tour[(bestMove["k"] + 1) % N] ])
-            Make_3_Opt_Move(tour, bestMove["i"], bestMove["j"], bestMove["k"],bestMove["optCase"])
+            Make_3_Opt_Move(tour, bestMove["i"], bestMove["j"], bestMove["k"],bestMove["optCase"], pos)
     return improved
 
 
-# # Make_Segment_Shift_Move
+# # JIT_Kernels
+# Optional compiled backend for the hot loops of the searches on array-backed tours (see `Build_Array_Tour()`) with the `distanceMatrix`: the scan of the neighbors with the evaluation of the gains in `One_City_2_Opt_NDR()` and `One_City_3_Opt_ND()` (First improvement), and the reversal of the segments in `Reverse_Segment()`.
+# <br>
+# If `Use_JIT` is True (the default) the searches use the kernels when `numba` is installed, otherwise only the Python code; `Use_JIT` can be set to False to use the Python code also with `numba`. `numba` is imported only by the first search that could use the kernels (see `Jit_Loaded()`), and not when the module is imported, so the processes that don't use it (or that use only the Python code) don't pay its import; the kernels are then compiled with `njit` at their first call. The kernels find the same moves of the Python code, in the same order, so the tours are identical with both the backends. They are plain Python on `numpy` arrays, so they can be called (slowly) also without `numba`.
+# <br>
+# `Jit()` only records the name of a kernel; `Jit_Loaded()` imports `numba` the first time, replaces each recorded kernel with its `njit` version (so the searches call it without any wrapper), and returns True if `numba` is installed, remembering the result in `jitLoaded` (that can be set to True to run the kernels as Python code, to check them without `numba`).
+# <br>
+# The tour and the position index are passed as `numpy` views of their arrays, the Neighbor List as a `numpy` matrix built once by `Neighbors_Array()`. The kernels return the move found and the number of gains evaluated, for the instrumentation.
+
+# In[ ]:
+
+
+Use_JIT = True
+jitLoaded = None # None until numba is looked for
+jitKernels = []
+def Jit(function):
+    jitKernels.append(function.__name__)
+    return function
+
+def Jit_Loaded():
+    global jitLoaded
+    if jitLoaded is None:
+        try:
+            from numba import njit
+        except ImportError:
+            jitLoaded = False
+        else:
+            for name in jitKernels:
+                globals()[name] = njit(cache=True)(globals()[name])
+            jitLoaded = True
+    return jitLoaded
+
+def Jit_Ready(tour, pos):
+    return Use_JIT and distanceMatrix is not None and isinstance(tour, array) and isinstance(pos, array) and Jit_Loaded()
+
+jitNeighbors = {"rows": None, "array": None}
+def Neighbors_Array(neighbor):
+    if jitNeighbors["rows"] is not neighbor:
+        jitNeighbors["rows"] = neighbor
+        jitNeighbors["array"] = np.array([[0] * len(neighbor[1])] + list(neighbor[1:]), dtype=np.intc)
+    return jitNeighbors["array"]
+
+@Jit
+def Reverse_Segment_Kernel(cities, positions, startIndex, endIndex, shorter):
+    N = cities.shape[0]
+    segmentLen = (N + endIndex - startIndex + 1) % N
+    reversedRest = shorter and 2 * segmentLen > N
+    if reversedRest:
+        startIndex, endIndex = (endIndex + 1) % N, (N + startIndex - 1) % N
+        segmentLen = N - segmentLen
+    left = startIndex
+    right = endIndex
+    for counter in range(segmentLen // 2):
+        aux = cities[left]
+        cities[left] = cities[right]
+        cities[right] = aux
+        left = (left + 1) % N
+        right = (N + right - 1) % N
+    if positions.shape[0] > 0:
+        index = startIndex
+        for counter in range(segmentLen):
+            positions[cities[index]] = index
+            index = (index + 1) % N
+    return reversedRest
+
+@Jit
+def Scan_2_Opt_Kernel(tour, pos, D, neighbor, basePos, numberOfNeigbors, first, fixedRadius, Fraction_Radius):
+    N = tour.shape[0]
+    bestGain, bestI, bestJ = 0, 0, 0
+    bestX1, bestX2, bestY1, bestY2 = 0, 0, 0, 0
+    evaluated = 0
+    for direction in range(2):
+        if direction == 0:
+            i = basePos
+            X1 = tour[i]
+            X2 = tour[(i+1) % N]
+        else:
+            i = (N + basePos - 1) % N
+            X2 = tour[i]
+            X1 = tour[(i+1) % N]
+        radius = D[X1, X2]
+        for neighbor_number in range(numberOfNeigbors):
+            Y1 = neighbor[X1, neighbor_number]
+            if direction == 0:
+                j = pos[Y1]
+                Y2 = tour[(j+1) % N]
+            else:
+                j = (N + pos[Y1] - 1) % N
+                Y2 = tour[j]
+            if X2 == Y1 or Y2 == X1:
+                continue
+            if fixedRadius and D[X1, Y1] > radius * Fraction_Radius:
+                break
+            gain = np.int64(D[X1, X2]) + D[Y1, Y2] - D[X1, Y1] - D[X2, Y2]
+            evaluated += 1
+            if gain > bestGain:
+                bestGain, bestI, bestJ = gain, i, j
+                bestX1, bestX2, bestY1, bestY2 = X1, X2, Y1, Y2
+                if first:
+                    break
+        if first and bestGain > 0:
+            break
+    return bestGain, bestI, bestJ, bestX1, bestX2, bestY1, bestY2, evaluated
+
+@Jit
+def Scan_3_Opt_Kernel(tour, pos, D, neighbor, basePos, numberOfNeigbors):
+    N = tour.shape[0]
+    bestGain, bestI, bestJ, bestK, bestCase = 0, 0, 0, 0, 0
+    evaluated2, evaluated3 = 0, 0
+    for direction in range(2):
+        if direction == 0:
+            i = basePos
+        else:
+            i = (N + basePos - 1) % N
+        X1 = tour[i]
+        X2 = tour[(i+1) % N]
+        for neighbor_1 in range(numberOfNeigbors):
+            Y2 = neighbor[X1, neighbor_1]
+            j = (pos[Y2] + N - 1) % N
+            Y1 = tour[j]
+            if Y1 != X1 and Y1 != X2:
+                gain = np.int64(D[X1, X2]) + D[Y1, Y2] - D[X1, Y1] - D[X2, Y2]
+                evaluated2 += 1
+                if gain > 0:
+                    bestGain, bestI, bestJ, bestK, bestCase = gain, i, j, j, 1
+                    break
+            for neighbor_2 in range(numberOfNeigbors):
+                Z1_6 = neighbor[Y1, neighbor_2]
+                k_6 = pos[Z1_6]
+                Z2_6 = tour[(k_6 + 1) % N]
+                Z2_7 = neighbor[Y1, neighbor_2]
+                k_7 = (pos[Z2_7] + N - 1) % N
+                Z1_7 = tour[k_7]
+                if (k_6 > i and j > i and j < k_6) or (k_6 < i and (j > i or j < k_6)): # Between(i, j, k_6)
+                    gain = np.int64(D[X1, X2]) + D[Y1, Y2] + D[Z1_6, Z2_6] - D[X1, Y2] - D[Z1_6, Y1] - D[X2, Z2_6]
+                    evaluated3 += 1
+                    if gain > 0:
+                        bestGain, bestI, bestJ, bestK, bestCase = gain, i, j, k_6, 6
+                        break
+                if (k_7 > i and j > i and j < k_7) or (k_7 < i and (j > i or j < k_7)): # Between(i, j, k_7)
+                    gain = np.int64(D[X1, X2]) + D[Y1, Y2] + D[Z1_7, Z2_7] - D[X1, Y2] - D[Z1_7, X2] - D[Y1, Z2_7]
+                    evaluated3 += 1
+                    if gain > 0:
+                        bestGain, bestI, bestJ, bestK, bestCase = gain, i, j, k_7, 7
+                        break
+            if bestGain > 0:
+                break
+        if bestGain > 0:
+            break
+    return bestGain, bestI, bestJ, bestK, bestCase, evaluated2, evaluated3
+
+
+# # One_City_2_Opt_JIT
+# `One_City_2_Opt_NDR()` with the scan of the neighbors done by `Scan_2_Opt_Kernel()` (see `JIT_Kernels`): it is called by it when `Jit_Ready()`, with the same parameters, and applies the same move.
+
+# In[ ]:
+
+
+def One_City_2_Opt_JIT(tour, basePos, neighbor, numberOfNeigbors, DontLook, improvement, speedup, Fraction_Radius, pos):
+    gain, i, j, X1, X2, Y1, Y2, evaluated = Scan_2_Opt_Kernel(np.frombuffer(tour, dtype=np.intc), np.frombuffer(pos, dtype=np.intc), distanceMatrix, Neighbors_Array(neighbor), basePos, numberOfNeigbors, improvement == "First", "FixedRadius" in speedup, Fraction_Radius)
+    if instrumentation:
+        counters["Gain_From_2_Opt"] += int(evaluated)
+    if gain <= 0:
+        return 0
+    if "DLB" in speedup:
+        Set_DLB_off(DontLook, [int(X1), int(X2), int(Y1), int(Y2)])
+    Make_2_Opt_Move(tour, int(i), int(j), pos)
+    return int(gain)
+
+
+# # One_City_3_Opt_JIT
+# `One_City_3_Opt_ND()` (First improvement) with the scan of the neighbors done by `Scan_3_Opt_Kernel()`: it is called by it when `Jit_Ready()`, with the same parameters, and applies the same move.
+
+# In[ ]:
+
+
+def One_City_3_Opt_JIT(tour, basePos, neighbor, numberOfNeigbors, DontLook, pos):
+    N = len(tour)
+    gain, i, j, k, optCase, evaluated2, evaluated3 = Scan_3_Opt_Kernel(np.frombuffer(tour, dtype=np.intc), np.frombuffer(pos, dtype=np.intc), distanceMatrix, Neighbors_Array(neighbor), basePos, numberOfNeigbors)
+    if instrumentation:
+        counters["Gain_From_2_Opt"] += int(evaluated2)
+        counters["Gain_From_3_Opt"] += int(evaluated3)
+    if gain <= 0:
+        return 0
+    i, j, k = int(i), int(j), int(k)
+    cities = [tour[i], tour[(i+1) % N], tour[j], tour[(j+1) % N]]
+    if optCase != 1:
+        cities += [tour[k], tour[(k+1) % N]]
+    Set_DLB_off(DontLook, cities)
+    Make_3_Opt_Move(tour, i, j, k, "opt3_case_%d" % optCase, pos)
+    return int(gain)
+
+
+# # Make_Segment_Shift_Move
 # Shifts the segment of `tour`: cities from `tour[i+1]` to `tour[j]` from their current position to position after current city `tour[k]`, that is between cities `tour[k]` and `tour[k+1]`.
 # <br>
 # `k`, `k+1` must not be within the segment `[i+1..j]`
@@ -908,15 +2029,17 @@ def One_City_3_Opt_ND(tour, basePos, neighbor, numberOfNeigbors, DontLook, impro
 # (it is the same that to do the opt_case_7 of 3Opt).
 # <br>
 # It is used if used the Or-opt method.
+# <br>
+# `pos` is the optional position index of the tour, updated by the move.
 
 # In[ ]:
 
 
-def Make_Segment_Shift_Move(tour,i, j, k):
+def Make_Segment_Shift_Move(tour,i, j, k, pos = None):
     N = len(tour)
-    Reverse_Segment(tour, (k+1) % N, i)
-    Reverse_Segment(tour, (i+1) % N, j)
-    Reverse_Segment(tour, (j+1) % N, k)
+    if instrumentation:
+        counters["Make_Segment_Shift_Move"] += 1
+    Reverse_Segments(tour, [((k+1) % N, i), ((i+1) % N, j), ((j+1) % N, k)], pos)
 
 
 # # Gain_From_Segment_Shift
@@ -932,6 +2055,8 @@ def Make_Segment_Shift_Move(tour,i, j, k):
 
 
 def Gain_From_Segment_Shift(X1, X2, Y1, Y2, Z1, Z2):
+    if instrumentation:
+        counters["Gain_From_Segment_Shift"] += 1
 
     del_Length = distance(X1, X2) + distance(Y1, Y2) + distance(Z1, Z2)
     add_Length = distance(X1, Y2) + distance(Z1, X2) + distance(Y1, Z2)
@@ -940,23 +2065,52 @@ def Gain_From_Segment_Shift(X1, X2, Y1, Y2, Z1, Z2):
 
 
 # # LS_Or_Opt
-# Optimizes the given tour using Or-opt without speedup
+# Optimizes the given tour using Or-opt with or without speedup.
+# <br>
+# Without speedup it uses `One_City_Or_Opt()`, with `speedup` ("NeighborList", "DLB", "FixedRadius" or a combination of them) it uses `One_City_Or_Opt_NDR()`; the parameters `No_Of_Neigbors` and `Fraction_Radius` are the same of `LS_2_Opt()`.
+# <br>
+# With the "TwoLevel" `representation` (see `LS_2_Opt()`) it uses `One_City_Or_Opt_TwoLevel()`.
 
 # In[ ]:
 
 
-def LS_Or_Opt(tour, improvement): 
+def LS_Or_Opt(tour, improvement, speedup = "False", No_Of_Neigbors = False, Fraction_Radius = 1, representation = "array", timeLimit = None, moveLimit = None): 
+    Start_Search(tour, timeLimit, moveLimit)
     del tour[len(tour)-1]
     N = len(tour)
     locallyOptimal = False
+    neighbor = False
+    neighborListLen = N-1
+    if "NeighborList" in speedup:
+        if No_Of_Neigbors == False:
+            No_Of_Neigbors = (int)(len(tour)/10)
+        neighborListLen = min(No_Of_Neigbors, len(tour)-1)
+        neighbor = Build_Neighbors_Matrix(neighborListLen,N)
+    DontLook = False
+    if "DLB" in speedup:
+        DontLook = DontLookBits(tour)
+    if representation == "TwoLevel":
+        LS_Two_Level(tour, One_City_Or_Opt_TwoLevel, improvement, speedup, neighbor, neighborListLen, DontLook, Fraction_Radius)
+        locallyOptimal = True
+    elif speedup != "False":
+        pos = Build_Position_Index(tour) # the candidates for the insertion are cities, their positions are read from pos
+        if "DLB" in speedup:
+            LS_Active_Cities(tour, DontLook, lambda baseCity: One_City_Or_Opt_NDR(tour, pos[baseCity], neighbor, neighborListLen, DontLook, improvement, speedup, Fraction_Radius, pos))
+            locallyOptimal = True
   
-    while not locallyOptimal:
+    while not locallyOptimal and not searchStatus["exhausted"]:
         locallyOptimal = True
-        for basePos in range(0,N):
-            baseCity = tour[basePos]
-            improved = One_City_Or_Opt(tour, basePos, improvement)
-            if improved:
-                locallyOptimal = False
+        with Timed("LS_sweep"):
+            for basePos in range(0,N):
+                if Budget_Exhausted():
+                    break
+                if speedup == "False":
+                    improved = One_City_Or_Opt(tour, basePos, improvement)
+                else:
+                    improved = One_City_Or_Opt_NDR(tour, basePos, neighbor, neighborListLen, DontLook, improvement, speedup, Fraction_Radius, pos)
+                if improved:
+                    locallyOptimal = False
+                    Track_Move(tour, improved)
     tour.append(tour[0])
     return tour
 
@@ -970,7 +2124,7 @@ def LS_Or_Opt(tour, improvement):
 
 
 def One_City_Or_Opt(tour, basePos, improvement):
-    improved = False
+    improved = 0
     if improvement == "Best":
         locallyOptimal = True
         bestMove = {"gain":0,"i":0,"j":0,"k":0}
@@ -995,12 +2149,12 @@ def One_City_Or_Opt(tour, basePos, improvement):
             if improvement == "First":
                 if gainExpected > 0:
                     Make_Segment_Shift_Move(tour, i, j, k)
-                    improved = True
+                    improved = gainExpected
                     return improved
             else:
                 if gainExpected > bestMove["gain"]:
                     bestMove = {"gain":gainExpected,"i":i,"j":j,"k":k}
-                    improved = True
+                    improved = gainExpected
                     locallyOptimal = False
     if improvement == "Best":
         if not locallyOptimal:
@@ -1008,13 +2162,774 @@ def One_City_Or_Opt(tour, basePos, improvement):
     return improved
 
 
+# # One_City_Or_Opt_NDR
+# Or-opt search with speedup (Neighbor List, DLB and/or Fixed Radius) on the list or array of the cities.
+# <br>
+# For segment length equal 3, 2, 1, it considers the segment starting from `tour[basePos]` and the one ending in `tour[basePos]`: the segment is `X2`..`Y1` (positions `i+1`..`j`), between `X1` and `Y2`.
+# <br>
+# The cities `Z1`, `Z2` between which the segment can be moved are found from the neighbors of `X2` and of `Y1` (all the cities without Neighbor List), so that one of the new links is a link to a neighbor; both the orientations of the segment are evaluated: as it is (`Gain_From_Segment_Shift()`, that is opt3_case_7) and reversed (opt3_case_6).
+# <br>
+# With Fixed Radius, a new link from an end of the segment must be shorter than the link removed from that end (multiplied by `Fraction_Radius`).
+# <br>
+# Only the don't look bits of the six cities of the move are turned off.
+# <br>
+# The other parameters are the same of `One_City_2_Opt_NDR()`.
+
+# In[ ]:
+
+
+def One_City_Or_Opt_NDR(tour, basePos, neighbor, numberOfNeigbors, DontLook, improvement, speedup, Fraction_Radius, pos):
+    improved = 0
+    bestMove = {"gain":0,"i":0,"j":0,"k":0,"optCase":0,"cities":[]}
+    N = len(tour)
+    allCities = range(1, N+1)
+
+    for segmentLen in [3,2,1]:
+        if segmentLen + 3 > N:
+            continue
+        for direction in ["forward", "backward"]:
+            if direction == "forward":
+                i = (N + basePos - 1) % N
+            else:
+                i = (N + basePos - segmentLen) % N
+            j  = (i + segmentLen) % N
+            X1 = tour[i]
+            X2 = tour[(i + 1) % N]
+            Y1 = tour[j]
+            Y2 = tour[(j + 1) % N]
+            for end, radius in [(X2, distance(X1, X2)), (Y1, distance(Y1, Y2))]:
+                for candidate in (neighbor[end] if neighbor != False else allCities):
+                    if "FixedRadius" in speedup:
+                        if distance(end, candidate) > radius*Fraction_Radius:
+                            if neighbor != False:
+                                break # the next neighbors are farther
+                            continue
+                    for optCase in ["opt3_case_7", "opt3_case_6"]:
+                        # the new link end-candidate is Z1-X2 or Y1-Z2 (segment as it is), X2-Z2 or Z1-Y1 (segment reversed)
+                        if (end == X2) == (optCase == "opt3_case_7"):
+                            k = pos[candidate]
+                        else:
+                            k = (N + pos[candidate] - 1) % N
+                        if (N + k - i) % N <= segmentLen: # Z1 or Z2 in the segment
+                            continue
+                        Z1 = tour[k]
+                        Z2 = tour[(k + 1) % N]
+                        if optCase == "opt3_case_7":
+                            gainExpected = Gain_From_Segment_Shift(X1, X2, Y1, Y2, Z1, Z2)
+                        else:
+                            gainExpected = Gain_From_3_Opt(X1, X2, Y1, Y2, Z1, Z2, optCase)
+                        if gainExpected > bestMove["gain"]:
+                            bestMove = {"gain":gainExpected,"i":i,"j":j,"k":k,"optCase":optCase,"cities":[X1, X2, Y1, Y2, Z1, Z2]}
+                            if improvement == "First":
+                                break
+                    if improvement == "First" and bestMove["gain"] > 0:
+                        break
+                if improvement == "First" and bestMove["gain"] > 0:
+                    break
+            if improvement == "First" and bestMove["gain"] > 0:
+                break
+        if improvement == "First" and bestMove["gain"] > 0:
+            break
+    if bestMove["gain"] > 0:
+        improved = bestMove["gain"]
+        if "DLB" in speedup:
+            Set_DLB_off(DontLook, bestMove["cities"])
+        if bestMove["optCase"] == "opt3_case_7":
+            Make_Segment_Shift_Move(tour, bestMove["i"], bestMove["j"], bestMove["k"], pos)
+        else:
+            Make_3_Opt_Move(tour, bestMove["i"], bestMove["j"], bestMove["k"], bestMove["optCase"], pos)
+    return improved
+
+
+# # Make_2_Opt_Move_Cities
+# Performs the 2-opt move that replaces the links `a`-`b` and `c`-`d` with the links `a`-`c` and `b`-`d`, given the cities instead of their positions.
+# <br>
+# `b` must be next to `a` in the tour and `d` next to `c` in the same direction (both successors or both predecessors). The positions are read from the position index `pos`, updated by the move.
+
+# In[ ]:
+
+
+def Make_2_Opt_Move_Cities(tour, pos, a, b, c, d):
+    N = len(tour)
+    if tour[(pos[a] + 1) % N] == b:
+        Make_2_Opt_Move(tour, pos[a], pos[c], pos)
+    else: # b and d are the predecessors
+        Make_2_Opt_Move(tour, pos[b], pos[d], pos)
+
+
+# # LK_Candidates
+# Returns the candidates for the next step of a Lin-Kernighan move, sorted from the most promising one.
+# <br>
+# The link `t1`-`t2` is the one removed at last (`t2` is next to `t1`) and `gain` is the gain obtained until now, counting `t1`-`t2` as removed. A candidate is a neighbor `t3` of `t2` such that the new link `t2`-`t3` keeps the gain positive: `t4` is the city next to `t3` such that removing `t3`-`t4` and adding `t4`-`t1` closes the tour again.
+# <br>
+# The candidates are tuples (`distance(t3, t4) - distance(t2, t3)`, `t3`, `t4`); the links in `added` (added by the previous steps) can't be removed.
+
+# In[ ]:
+
+
+def LK_Candidates(tour, pos, t1, t2, gain, neighbor, added):
+    N = len(tour)
+    if tour[(pos[t1] + 1) % N] == t2:
+        step = N - 1 # t4 is the predecessor of t3
+    else:
+        step = 1     # t4 is the successor of t3
+    candidates = []
+    for t3 in neighbor[t2]:
+        newLink = distance(t2, t3)
+        if gain - newLink <= 0:
+            break # the next neighbors are farther from t2
+        if t3 == t1:
+            continue
+        t4 = tour[(pos[t3] + step) % N]
+        if t4 == t2 or (t3, t4) in added or (t4, t3) in added:
+            continue
+        candidates.append((distance(t3, t4) - newLink, t3, t4))
+    candidates.sort(reverse = True)
+    return candidates
+
+
+# # One_City_LK
+# Lin-Kernighan move starting from the city `baseCity`, made of a sequence of 2-opt moves (variable depth search).
+# <br>
+# For both the links of `baseCity` (`t1`-`t2`), the link is removed and a new link `t2`-`t3` is added, with `t3` among the neighbors of `t2` (see `LK_Candidates()`); the tour is closed again removing `t3`-`t4` and adding `t4`-`t1`. Then the search goes on from the link `t1`-`t4` as the new `t1`-`t2`, while the gain (without the closing link) is positive, for at most `maxDepth` steps.
+# <br>
+# At the first step the first `LK_Breadth` candidates are tried, at the next steps only the best one. The sequence is cut after the step with the best gain of the tour, the steps after it are undone.
+# <br>
+# With the First improvement the first sequence with positive gain is kept, with the Best improvement the best of all the tried sequences.
+# <br>
+# The don't look bits of the cities of the kept sequence are turned off; `DontLook` and `pos` are the same of `One_City_2_Opt_NDR()`.
+
+# In[ ]:
+
+
+LK_Breadth = 5
+LK_Max_Depth = 50
+def One_City_LK(tour, baseCity, neighbor, DontLook, improvement, pos, maxDepth = LK_Max_Depth):
+    N = len(tour)
+    improved = 0
+    bestMove = {"gain":0,"steps":[]}
+    t1 = baseCity
+    for firstT2 in [tour[(pos[t1] + 1) % N], tour[(pos[t1] + N - 1) % N]]:
+        for (_, firstT3, firstT4) in LK_Candidates(tour, pos, t1, firstT2, distance(t1, firstT2), neighbor, set())[:LK_Breadth]:
+            t2, t3, t4 = firstT2, firstT3, firstT4
+            gain = distance(t1, t2)
+            steps = []
+            added = set()
+            bestGain = 0
+            bestDepth = 0
+            while True:
+                gain += distance(t3, t4) - distance(t2, t3)
+                Make_2_Opt_Move_Cities(tour, pos, t1, t2, t4, t3)
+                steps.append((t2, t3, t4))
+                added.add((t2, t3))
+                if gain - distance(t4, t1) > bestGain:
+                    bestGain = gain - distance(t4, t1)
+                    bestDepth = len(steps)
+                if len(steps) == maxDepth:
+                    break
+                t2 = t4
+                candidates = LK_Candidates(tour, pos, t1, t2, gain, neighbor, added)
+                if len(candidates) == 0:
+                    break
+                _, t3, t4 = candidates[0]
+            while len(steps) > bestDepth: # the steps after the best one are undone
+                t2, t3, t4 = steps.pop()
+                Make_2_Opt_Move_Cities(tour, pos, t1, t4, t2, t3)
+            if bestGain > bestMove["gain"]:
+                bestMove = {"gain":bestGain,"steps":list(steps)}
+                if improvement == "First":
+                    break # the sequence is kept in the tour
+            for (t2, t3, t4) in reversed(steps):
+                Make_2_Opt_Move_Cities(tour, pos, t1, t4, t2, t3)
+        if improvement == "First" and bestMove["gain"] > 0:
+            break
+    if bestMove["gain"] > 0:
+        if improvement == "Best":
+            for (t2, t3, t4) in bestMove["steps"]:
+                Make_2_Opt_Move_Cities(tour, pos, t1, t2, t4, t3)
+        improved = bestMove["gain"]
+        Set_DLB_off(DontLook, [t1] + [city for step in bestMove["steps"] for city in step])
+    return improved
+
+
+# # LS_LK
+# Optimizes the given tour using Lin-Kernighan moves (see `One_City_LK()`), always with Neighbor List and DLB.
+# <br>
+# `No_Of_Neigbors` is the number of neighbors of each city (`LK_No_Of_Neighbors` by default: the Lin-Kernighan search needs only few near cities).
+# <br>
+# `timeLimit` and `moveLimit` are the budget of the search, as in `LS_2_Opt_NoSpeedup()`.
+
+# In[ ]:
+
+
+LK_No_Of_Neighbors = 10
+def LS_LK(tour, improvement, No_Of_Neigbors = False, timeLimit = None, moveLimit = None):
+    Start_Search(tour, timeLimit, moveLimit)
+    del tour[len(tour)-1]
+    N = len(tour)
+    if No_Of_Neigbors == False:
+        No_Of_Neigbors = LK_No_Of_Neighbors
+    neighborListLen = min(No_Of_Neigbors, len(tour)-1)
+    neighbor = Build_Neighbors_Matrix(neighborListLen,N)
+    pos = Build_Position_Index(tour)
+    DontLook = DontLookBits(tour)
+    LS_Active_Cities(tour, DontLook, lambda baseCity: One_City_LK(tour, baseCity, neighbor, DontLook, improvement, pos))
+    tour.append(tour[0])
+    return tour
+
+
+# # TwoLevelTour
+# Two-level doubly-linked list representation of the tour, used for the instances with many cities (100k and more), where reversing a segment of a list (O(N) for each move) is too slow.
+# <br>
+# The tour is divided in about √N segments (`Segment`), kept in the cyclic list `segments`: each of them has the list of its `cities`, a bit `reversed` telling if the cities are traversed from the last one to the first one, and its `rank` in `segments`. `segmentOf[city]` and `indexOf[city]` say where a city is.
+# <br>
+# The operations are:
+# <br>
+# `next(city)` and `prev(city)`: the successor and the predecessor of `city` in the tour;
+# <br>
+# `between(a, b, c)`: True if going forward from `a` we find `b` before (or at) `c`;
+# <br>
+# `sequence()`: the list of the cities in the order of the tour;
+# <br>
+# `reverse(a, b)`: reverses the path of the tour going forward from `a` to `b`. The two ends of the path are made ends of segments (splitting at most two segments), then the segments of the path (or of the rest of the tour, if they are less) are reversed changing their order and their bits, without touching their cities: O(√N) for each move. Small segments near the cuts are joined again, so that their number stays about √N;
+# <br>
+# `two_opt_move(t1, t2, t3, t4)`: removes the links `t1`-`t2` and `t3`-`t4` (with `t2` after `t1` and `t4` after `t3`, or both before) and adds the links `t1`-`t3` and `t2`-`t4`. It doesn't depend on the direction of the tour, so the 3-opt and Or-opt moves are made as sequences of it (see `Make_3_Opt_Move_TwoLevel()`).
+
+# In[ ]:
+
+
+class Segment:
+    __slots__ = ("cities", "reversed", "rank")
+    def __init__(self, cities, reversed, rank):
+        self.cities = cities
+        self.reversed = reversed
+        self.rank = rank
+
+class TwoLevelTour:
+    def __init__(self, tour, groupSize = False):
+        N = len(tour)
+        if groupSize == False:
+            groupSize = max(8, int(N ** 0.5))
+        self.groupSize = groupSize
+        self.segmentOf = [None] * (max(tour) + 1)
+        self.indexOf = [0] * (max(tour) + 1)
+        self.segments = []
+        for first in range(0, N, groupSize):
+            self.segments.append(Segment(list(tour[first:first+groupSize]), False, len(self.segments)))
+            self.Reindex(self.segments[-1])
+
+    def Reindex(self, segment):
+        for index, city in enumerate(segment.cities):
+            self.segmentOf[city] = segment
+            self.indexOf[city] = index
+
+    def Renumber(self, fromRank):
+        for rank in range(fromRank, len(self.segments)):
+            self.segments[rank].rank = rank
+
+    def next(self, city):
+        segment = self.segmentOf[city]
+        index = self.indexOf[city]
+        if segment.reversed:
+            if index > 0:
+                return segment.cities[index - 1]
+        elif index + 1 < len(segment.cities):
+            return segment.cities[index + 1]
+        segment = self.segments[(segment.rank + 1) % len(self.segments)]
+        return segment.cities[-1] if segment.reversed else segment.cities[0]
+
+    def prev(self, city):
+        segment = self.segmentOf[city]
+        index = self.indexOf[city]
+        if segment.reversed:
+            if index + 1 < len(segment.cities):
+                return segment.cities[index + 1]
+        elif index > 0:
+            return segment.cities[index - 1]
+        segment = self.segments[segment.rank - 1]
+        return segment.cities[0] if segment.reversed else segment.cities[-1]
+
+    def Key(self, city): # position of the city in the order of the tour, starting from the first segment
+        segment = self.segmentOf[city]
+        index = self.indexOf[city]
+        if segment.reversed:
+            index = len(segment.cities) - 1 - index
+        return segment.rank * len(self.segmentOf) + index
+
+    def between(self, a, b, c):
+        keyA, keyB, keyC = self.Key(a), self.Key(b), self.Key(c)
+        if keyA <= keyC:
+            return keyA <= keyB <= keyC
+        return keyB >= keyA or keyB <= keyC
+
+    def sequence(self):
+        cities = []
+        for segment in self.segments:
+            cities.extend(reversed(segment.cities) if segment.reversed else segment.cities)
+        return cities
+
+    def Split_Before(self, city): # makes city the first one of its segment, in the order of the tour
+        segment = self.segmentOf[city]
+        index = self.indexOf[city]
+        if segment.reversed:
+            if index == len(segment.cities) - 1:
+                return
+            before, after = segment.cities[index+1:], segment.cities[:index+1]
+        else:
+            if index == 0:
+                return
+            before, after = segment.cities[:index], segment.cities[index:]
+        segment.cities = before
+        newSegment = Segment(after, segment.reversed, segment.rank + 1)
+        self.segments.insert(segment.rank + 1, newSegment)
+        self.Renumber(segment.rank + 2)
+        self.Reindex(segment)
+        self.Reindex(newSegment)
+
+    def Merge_With_Next(self, segment): # joins segment and the following one if together they aren't larger than groupSize
+        following = self.segments[(segment.rank + 1) % len(self.segments)]
+        if following is segment or following.rank == 0 or len(segment.cities) + len(following.cities) > self.groupSize:
+            return
+        first = segment.cities[::-1] if segment.reversed else segment.cities
+        second = following.cities[::-1] if following.reversed else following.cities
+        segment.cities = first + second
+        segment.reversed = False
+        del self.segments[following.rank]
+        self.Renumber(following.rank)
+        self.Reindex(segment)
+
+    def reverse(self, a, b):
+        if a == b or self.next(b) == a: # reversing all the tour gives the same cycle
+            return
+        self.Split_Before(a)
+        self.Split_Before(self.next(b))
+        M = len(self.segments)
+        first = self.segmentOf[a].rank
+        last = self.segmentOf[b].rank
+        count = (last - first) % M + 1
+        if 2 * count > M: # the rest of the tour has less segments: reversing it gives the same cycle
+            first, last, count = (last + 1) % M, (first - 1) % M, M - count
+        left, right = first, last
+        for counter in range(count // 2):
+            self.segments[left], self.segments[right] = self.segments[right], self.segments[left]
+            left, right = (left + 1) % M, (right - 1) % M
+        for counter in range(count):
+            segment = self.segments[(first + counter) % M]
+            segment.rank = (first + counter) % M
+            segment.reversed = not segment.reversed
+        for segment in [self.segments[(last + 1) % M], self.segments[last], self.segments[first], self.segments[(first - 1) % M]]:
+            if self.segments[segment.rank % len(self.segments)] is segment: # it could have been joined to another one
+                self.Merge_With_Next(segment)
+
+    def two_opt_move(self, t1, t2, t3, t4):
+        if instrumentation:
+            counters["TwoLevel_2_Opt_Move"] += 1
+        if self.next(t1) == t2:
+            self.reverse(t2, t3)
+        else:
+            self.reverse(t1, t4)
+
+
+# # Make_3_Opt_Move_TwoLevel
+# Performs the 3-opt move opt3_case_6 or opt3_case_7 (see `Gain_From_3_Opt()`) on a `TwoLevelTour`, as a sequence of 2-opt moves.
+# <br>
+# `X2` follows `X1`, `Y2` follows `Y1` and `Z2` follows `Z1`, in the cyclic order `X1`,`Y1`,`Z1` (going forward or backward in the tour).
+# <br>
+# opt3_case_6 (a'bc'): it replaces `Y1`-`Y2` and `Z1`-`Z2` with `Y1`-`Z1` and `Y2`-`Z2`, then `X1`-`X2` and `Y2`-`Z2` with `X1`-`Y2` and `X2`-`Z2`.
+# <br>
+# opt3_case_7 (a'b'c', that is also the Segment Shift of `X2`..`Y1` between `Z1` and `Z2`): three 2-opt moves, giving the links `X1`-`Y1` and `X2`-`Y2`, then `X1`-`Z1` and `Y1`-`Z2`, then `X1`-`Y2` and `Z1`-`X2`.
+
+# In[ ]:
+
+
+def Make_3_Opt_Move_TwoLevel(tour, X1, X2, Y1, Y2, Z1, Z2, optCase):
+    if optCase == "opt3_case_6":
+        tour.two_opt_move(Y1, Y2, Z1, Z2)
+        tour.two_opt_move(X1, X2, Y2, Z2)
+    elif optCase == "opt3_case_7":
+        tour.two_opt_move(X1, X2, Y1, Y2)
+        tour.two_opt_move(X1, Y1, Z1, Z2)
+        tour.two_opt_move(X1, Z1, Y2, X2)
+
+
+# # One_City_2_Opt_TwoLevel
+# Same search of `One_City_2_Opt_NDR()`, on a `TwoLevelTour`: the base city is `baseCity` instead of a position, and the successors are found with `next()` and `prev()`.
+# <br>
+# If the speedup doesn't use the Neighbor List (`neighbor` is False), all the cities are candidates for `Y1`.
+
+# In[ ]:
+
+
+def One_City_2_Opt_TwoLevel(tour, baseCity, neighbor, numberOfNeigbors, DontLook, improvement, speedup, Fraction_Radius):
+    improved = 0
+    bestMove = {"gain":0}
+    for direction in ["forward", "backward"]:
+        X1 = baseCity
+        X2 = tour.next(X1) if direction == "forward" else tour.prev(X1)
+        radius = distance(X1, X2)
+        candidates = neighbor[X1] if neighbor != False else range(1, len(tour.segmentOf))
+        for Y1 in candidates:
+            Y2 = tour.next(Y1) if direction == "forward" else tour.prev(Y1)
+            if (Y1 == X1) or (X2 == Y1) or (Y2 == X1):
+                continue
+            if "FixedRadius" in speedup:
+                if distance(X1, Y1) > radius*Fraction_Radius:
+                    if neighbor != False:
+                        break # the other neighbors are farther
+                    continue
+            gainExpected = Gain_From_2_Opt(X1, X2, Y1, Y2)
+            if gainExpected > bestMove["gain"]:
+                bestMove = {"gain":gainExpected,"X1":X1,"X2":X2,"Y1":Y1,"Y2":Y2}
+                if improvement == "First":
+                    break
+        if improvement == "First" and bestMove["gain"] > 0:
+            break
+    if bestMove["gain"] > 0:
+        if "DLB" in speedup:
+            Set_DLB_off(DontLook, [bestMove["X1"], bestMove["X2"], bestMove["Y1"], bestMove["Y2"]])
+        tour.two_opt_move(bestMove["X1"], bestMove["X2"], bestMove["Y1"], bestMove["Y2"])
+        improved = bestMove["gain"]
+    return improved
+
+
+# # One_City_3_Opt_TwoLevel
+# Same search of `One_City_3_Opt_ND()`, on a `TwoLevelTour`.
+# <br>
+# In the backward direction the successor of a city is its predecessor in the tour, so that `X1`,`Y1`,`Z1` are always in the cyclic order required by `Gain_From_3_Opt()`.
+
+# In[ ]:
+
+
+def One_City_3_Opt_TwoLevel(tour, baseCity, neighbor, numberOfNeigbors, DontLook, improvement, speedup, Fraction_Radius):
+    improved = 0
+    bestMove = {"gain":0}
+    allCities = range(1, len(tour.segmentOf))
+    for direction in ["forward", "backward"]:
+        if direction == "forward":
+            succ, pred, inOrder = tour.next, tour.prev, tour.between
+        else:
+            succ, pred, inOrder = tour.prev, tour.next, lambda a, b, c: tour.between(c, b, a)
+        X1 = baseCity
+        X2 = succ(X1)
+        for Y2 in (neighbor[X1] if neighbor != False else allCities):
+            # new edges in optCase=6: *X1-Y2*, Y1-Z1, X2-Z2
+            # new edges in optCase=7: *X1-Y2*, X2-Z1, Y1-Z2
+            Y1 = pred(Y2)
+            if Y2 == X1 or Y1 == X1 or Y1 == X2:
+                continue
+            gainExpected = Gain_From_2_Opt(X1, X2, Y1, Y2)
+            if gainExpected > bestMove["gain"]:
+                bestMove = {"gain":gainExpected,"cities":[X1, X2, Y1, Y2],"optCase":"opt3_case_1"}
+                if improvement == "First":
+                    break
+            for Z in (neighbor[Y1] if neighbor != False else allCities):
+                # new edges in optCase=6: X1-Y2, *Y1-Z1*, X2-Z2
+                Z1, Z2 = Z, succ(Z)
+                if Z1 != Y1 and Z1 != X1 and inOrder(X1, Y1, Z1):
+                    gainExpected = Gain_From_3_Opt(X1, X2, Y1, Y2, Z1, Z2, "opt3_case_6")
+                    if gainExpected > bestMove["gain"]:
+                        bestMove = {"gain":gainExpected,"cities":[X1, X2, Y1, Y2, Z1, Z2],"optCase":"opt3_case_6"}
+                        if improvement == "First":
+                            break
+                # new edges in optCase=7: X1-Y2, X2-Z1, *Y1-Z2*
+                Z1, Z2 = pred(Z), Z
+                if Z1 != Y1 and Z1 != X1 and inOrder(X1, Y1, Z1):
+                    gainExpected = Gain_From_3_Opt(X1, X2, Y1, Y2, Z1, Z2, "opt3_case_7")
+                    if gainExpected > bestMove["gain"]:
+                        bestMove = {"gain":gainExpected,"cities":[X1, X2, Y1, Y2, Z1, Z2],"optCase":"opt3_case_7"}
+                        if improvement == "First":
+                            break
+            if improvement == "First" and bestMove["gain"] > 0:
+                break
+        if improvement == "First" and bestMove["gain"] > 0:
+            break
+    if bestMove["gain"] > 0:
+        improved = bestMove["gain"]
+        if "DLB" in speedup:
+            Set_DLB_off(DontLook, bestMove["cities"])
+        if bestMove["optCase"] == "opt3_case_1":
+            tour.two_opt_move(*bestMove["cities"])
+        else:
+            Make_3_Opt_Move_TwoLevel(tour, *bestMove["cities"], bestMove["optCase"])
+    return improved
+
+
+# # One_City_Or_Opt_TwoLevel
+# Or-opt search on a `TwoLevelTour`: for segment length equal 3, 2, 1, it considers the segments starting from `baseCity` going forward and going backward, and tries to move them between two cities `Z1` and `Z2` near to the ends of the segment.
+# <br>
+# The segment is `X2`..`Y1`, between `X1` and `Y2`. The candidates are the neighbors (or all the cities, without Neighbor List) of `X2` and of `Y1`, and both the orientations of the segment are evaluated: as it is (`Gain_From_Segment_Shift()`, that is opt3_case_7) and reversed (opt3_case_6).
+# <br>
+# With Fixed Radius, a new link from an end of the segment must be shorter than the link removed from that end.
+
+# In[ ]:
+
+
+def One_City_Or_Opt_TwoLevel(tour, baseCity, neighbor, numberOfNeigbors, DontLook, improvement, speedup, Fraction_Radius):
+    improved = 0
+    bestMove = {"gain":0}
+    allCities = range(1, len(tour.segmentOf))
+    if len(allCities) < 5:
+        return improved
+    for segmentLen in [3,2,1]:
+        if segmentLen + 3 > len(allCities):
+            continue
+        for direction in ["forward", "backward"]:
+            succ, pred = (tour.next, tour.prev) if direction == "forward" else (tour.prev, tour.next)
+            X2 = baseCity
+            segment = [X2]
+            for counter in range(segmentLen - 1):
+                segment.append(succ(segment[-1]))
+            Y1 = segment[-1]
+            X1 = pred(X2)
+            Y2 = succ(Y1)
+            for end, radius in [(X2, distance(X1, X2)), (Y1, distance(Y1, Y2))]:
+                for candidate in (neighbor[end] if neighbor != False else allCities):
+                    if "FixedRadius" in speedup:
+                        if distance(end, candidate) > radius*Fraction_Radius:
+                            if neighbor != False:
+                                break
+                            continue
+                    for optCase in ["opt3_case_7", "opt3_case_6"]:
+                        # the new link end-candidate is Z1-X2 or Y1-Z2 (segment as it is), X2-Z2 or Z1-Y1 (segment reversed)
+                        if (end == X2) == (optCase == "opt3_case_7"):
+                            Z1, Z2 = candidate, succ(candidate)
+                        else:
+                            Z1, Z2 = pred(candidate), candidate
+                        if Z1 in segment or Z2 in segment:
+                            continue
+                        if optCase == "opt3_case_7":
+                            gainExpected = Gain_From_Segment_Shift(X1, X2, Y1, Y2, Z1, Z2)
+                        else:
+                            gainExpected = Gain_From_3_Opt(X1, X2, Y1, Y2, Z1, Z2, optCase)
+                        if gainExpected > bestMove["gain"]:
+                            bestMove = {"gain":gainExpected,"cities":[X1, X2, Y1, Y2, Z1, Z2],"optCase":optCase}
+                            if improvement == "First":
+                                break
+                    if improvement == "First" and bestMove["gain"] > 0:
+                        break
+                if improvement == "First" and bestMove["gain"] > 0:
+                    break
+            if improvement == "First" and bestMove["gain"] > 0:
+                break
+        if improvement == "First" and bestMove["gain"] > 0:
+            break
+    if bestMove["gain"] > 0:
+        improved = bestMove["gain"]
+        if "DLB" in speedup:
+            Set_DLB_off(DontLook, bestMove["cities"])
+        Make_3_Opt_Move_TwoLevel(tour, *bestMove["cities"], bestMove["optCase"])
+    return improved
+
+
+# # LS_Two_Level
+# Local search loop used by `LS_2_Opt()`, `LS_3_Opt()` and `LS_Or_Opt()` when `representation` is "TwoLevel": the `tour` (without the repeated last city) is copied in a `TwoLevelTour`, then `oneCitySearch` (`One_City_2_Opt_TwoLevel()`, `One_City_3_Opt_TwoLevel()` or `One_City_Or_Opt_TwoLevel()`) is called for each city, in the order of the tour, until no improvement can be done (with DLB, for the cities in the queue of `DontLook`, see `LS_Active_Cities()`). At the end the cities are copied back in `tour`.
+
+# In[ ]:
+
+
+def LS_Two_Level(tour, oneCitySearch, improvement, speedup, neighbor, numberOfNeigbors, DontLook, Fraction_Radius):
+    twoLevelTour = TwoLevelTour(tour)
+    locallyOptimal = False
+    if "DLB" in speedup:
+        LS_Active_Cities(twoLevelTour, DontLook, lambda baseCity: oneCitySearch(twoLevelTour, baseCity, neighbor, numberOfNeigbors, DontLook, improvement, speedup, Fraction_Radius))
+        locallyOptimal = True
+    while not locallyOptimal and not searchStatus["exhausted"]:
+        locallyOptimal = True
+        with Timed("LS_sweep"):
+            for baseCity in twoLevelTour.sequence():
+                if Budget_Exhausted():
+                    break
+                improved = oneCitySearch(twoLevelTour, baseCity, neighbor, numberOfNeigbors, DontLook, improvement, speedup, Fraction_Radius)
+                if improved:
+                    locallyOptimal = False
+                    Track_Move(twoLevelTour, improved)
+    del tour[:]
+    tour.extend(twoLevelTour.sequence())
+
+
+# # Build_First_Tour
+# Builds the initial tour with the method `firstSolution` ("NN", "random", "greedy" or "hilbert", see `Build_Greedy_Tour()` and `Build_Hilbert_Tour()`), as an array (see `Build_Array_Tour()`), because the local searches reverse the segments directly in the array.
+
+# In[ ]:
+
+
+def Build_First_Tour(firstSolution, nodes):
+    with Timed("construction"):
+        if firstSolution == "NN":
+            firstTour = Build_Nearest_Neighbor_Tour(1+(int)(random.random()*len(nodes)), nodes)
+        elif firstSolution == "random":
+            firstTour = Build_Random_Tour(nodes)
+        elif firstSolution == "greedy":
+            firstTour = Build_Greedy_Tour(nodes)
+        elif firstSolution == "hilbert":
+            firstTour = Build_Hilbert_Tour(nodes)
+        return Build_Array_Tour(firstTour)
+
+
+# # Double_Bridge_Kick
+# Perturbs the tour with a double bridge move inside a window of `segmentLength` consecutive cities starting from a random position: the window is cut in three segments `B`, `C` and `D`, that become `C`, `B` and `D` (as the double bridge `ABCD` -> `ACBD`, with `A` and the rest of the tour out of the window). Only the window is rewritten, with the positions in `pos`: `BC` is reversed, and then `C'` and `B'`, with `Reverse_Segment()`, so the kick is recorded in `reversalLog` as the moves.
+# <br>
+# It returns the increase of the tour length and the cities at the ends of the changed links.
+
+# In[ ]:
+
+
+def Double_Bridge_Kick(tour, pos, segmentLength):
+    N = len(tour)
+    windowLength = min(segmentLength, N - 2) # the city before the window is not in it
+    start = random.randrange(N)
+    a, b = sorted(random.sample(range(1, windowLength), 2))
+    window = [tour[(start + 1 + index) % N] for index in range(windowLength)]
+    previous = tour[start]
+    removed = distance(previous, window[0]) + distance(window[a-1], window[a]) + distance(window[b-1], window[b])
+    added = distance(previous, window[a]) + distance(window[b-1], window[0]) + distance(window[a-1], window[b])
+    first = (start + 1) % N
+    Reverse_Segment(tour, first, (first + b - 1) % N, pos)           # BC -> C'B'
+    Reverse_Segment(tour, first, (first + b - a - 1) % N, pos)       # C' -> C
+    Reverse_Segment(tour, (first + b - a) % N, (first + b - 1) % N, pos) # B' -> B
+    return added - removed, [previous, window[0], window[a-1], window[a], window[b-1], window[b]]
+
+
+# # Iterated_Local_Search
+# Iterated Local Search: after the local search `howToSolve` (2Opt, 3Opt, OrOpt or LK, always with Neighbor List and DLB, and FixedRadius if it is in `speedup`) has reached a local optimum, the tour is perturbed with `Double_Bridge_Kick()` in a window of `ILS_Kick_Length` cities, only the cities at the ends of the changed links are put in the queue of the active cities (see `DontLookBits`), and the local search is done again from them with `LS_Active_Cities()`.
+# <br>
+# If the new local optimum is not longer than the best tour it becomes the best tour, otherwise the tour goes back to the best one undoing the kick and the moves after it, recorded in `reversalLog` (see `Undo_Reversals()`). The tour, the position index, the Neighbor List and the DLB are kept from one iteration to the other, so an iteration costs only the search around the kick and its undo, without copying the tour.
+# <br>
+# It stops after `iterations` kicks (it can be `float("inf")`), or when the budget `timeLimit`/`moveLimit` of the whole search is exhausted (see `Search_Budget`), and returns the best tour; `searchStatus["length"]` is its length, and `searchStatus["exhausted"]` is True only if the budget has stopped the first local search. It counts `ILS_kicks` and `ILS_improvements` in the instrumentation.
+# <br>
+# If `exchange` is given, every `exchangeInterval` kicks (and once more at the end, if the last kicks are less than `exchangeInterval`) it is called with the best tour (without the return to the first city) and its length, and it returns a tour to adopt (or None), its length and True if the search has to stop (see `Island_Run()`). An adopted tour replaces the best tour with `Adopt_Tour()`, that puts in the queue of the active cities only the cities whose links have changed, and it is improved from them by the local search: so the search goes on without building again its structures.
+
+# In[ ]:
+
+
+ILS_Kick_Length = 50
+def Iterated_Local_Search(tour, howToSolve, improvement, speedup = "NeighborList+DLB", No_Of_Neigbors = False, Fraction_Radius = 1, iterations = 1000, timeLimit = None, moveLimit = None, exchange = None, exchangeInterval = 100):
+    if howToSolve not in ["2Opt", "3Opt", "OrOpt", "LK"]:
+        raise ValueError("Iterated_Local_Search supports howToSolve 2Opt, 3Opt, OrOpt or LK, not " + str(howToSolve))
+    Start_Search(tour, timeLimit, moveLimit)
+    del tour[len(tour)-1]
+    N = len(tour)
+    if No_Of_Neigbors == False:
+        No_Of_Neigbors = LK_No_Of_Neighbors if howToSolve == "LK" else (int)(N/10)
+    neighborListLen = min(No_Of_Neigbors, N-1)
+    neighbor = Build_Neighbors_Matrix(neighborListLen, N)
+    pos = Build_Position_Index(tour)
+    speedup = "NeighborList+DLB+FixedRadius" if "FixedRadius" in speedup else "NeighborList+DLB"
+    DontLook = DontLookBits(tour)
+    if howToSolve == "2Opt":
+        searchFromCity = lambda baseCity: One_City_2_Opt_NDR(tour, pos[baseCity], neighbor, neighborListLen, DontLook, improvement, speedup, Fraction_Radius, pos)
+    elif howToSolve == "3Opt":
+        searchFromCity = lambda baseCity: One_City_3_Opt_ND(tour, pos[baseCity], neighbor, neighborListLen, DontLook, improvement, pos)
+    elif howToSolve == "OrOpt":
+        searchFromCity = lambda baseCity: One_City_Or_Opt_NDR(tour, pos[baseCity], neighbor, neighborListLen, DontLook, improvement, speedup, Fraction_Radius, pos)
+    elif howToSolve == "LK":
+        searchFromCity = lambda baseCity: One_City_LK(tour, baseCity, neighbor, DontLook, improvement, pos)
+    LS_Active_Cities(tour, DontLook, searchFromCity)
+    locallyOptimal = len(DontLook.active) == 0
+    bestLength = searchStatus["length"] # the tour is always the best one, out of an iteration
+    kicks = 0
+    global reversalLog
+    reversalLog = []
+    try:
+        while locallyOptimal and kicks < iterations and N >= 8 and not Budget_Exhausted():
+            kicks += 1
+            if instrumentation:
+                counters["ILS_kicks"] += 1
+            increase, ends = Double_Bridge_Kick(tour, pos, ILS_Kick_Length)
+            searchStatus["length"] += increase
+            Set_DLB_off(DontLook, ends)
+            LS_Active_Cities(tour, DontLook, searchFromCity)
+            if len(DontLook.active) == 0 and searchStatus["length"] <= bestLength:
+                if instrumentation and searchStatus["length"] < bestLength:
+                    counters["ILS_improvements"] += 1
+                bestLength = searchStatus["length"]
+                reversalLog.clear()
+            else: # back to the best tour (also if the budget has stopped the search)
+                Undo_Reversals(tour, reversalLog, pos)
+                searchStatus["length"] = bestLength
+                DontLook.active.clear()
+                DontLook.queued.clear()
+            if exchange is not None and kicks % exchangeInterval == 0:
+                adopted, adoptedLength, stop = exchange(tour, bestLength)
+                if adopted is not None and not Budget_Exhausted():
+                    bestTour = tour[:] # the adoption already costs O(N)
+                    Adopt_Tour(tour, pos, adopted, DontLook)
+                    searchStatus["length"] = adoptedLength
+                    LS_Active_Cities(tour, DontLook, searchFromCity)
+                    reversalLog.clear()
+                    if len(DontLook.active) == 0:
+                        bestLength = searchStatus["length"]
+                    else: # stopped by the budget: the island keeps its tour
+                        Adopt_Tour(tour, pos, bestTour, DontLook)
+                        searchStatus["length"] = bestLength
+                        DontLook.active.clear()
+                        DontLook.queued.clear()
+                if stop:
+                    break
+    finally:
+        reversalLog = None
+    if exchange is not None and (kicks == 0 or kicks % exchangeInterval != 0):
+        exchange(tour, searchStatus["length"]) # the last kicks, or the tour of a search stopped by the budget
+    searchStatus["exhausted"] = not locallyOptimal
+    tour.append(tour[0])
+    return tour
+
+
+# # Adopt_Tour
+# Replaces the cities of `tour` (without the return to the first city) with the ones of the tour `adopted`, and updates the position index `pos`. The cities whose predecessor and successor are not the same in the two tours are put in the queue of the active cities of `DontLook` (see `Set_DLB_off()`): the other ones have the same links, so their search would find the same moves as before.
+
+# In[ ]:
+
+
+def Adopt_Tour(tour, pos, adopted, DontLook):
+    N = len(tour)
+    old = np.array(tour, dtype=np.int64)
+    new = np.array(adopted, dtype=np.int64)
+    oldNext, oldPrevious, newNext, newPrevious = (np.zeros(N + 1, dtype=np.int64) for links in range(4))
+    oldNext[old], oldPrevious[old] = np.roll(old, -1), np.roll(old, 1)
+    newNext[new], newPrevious[new] = np.roll(new, -1), np.roll(new, 1)
+    same = ((oldNext == newNext) & (oldPrevious == newPrevious)) | ((oldNext == newPrevious) & (oldPrevious == newNext))
+    tour[:] = Build_Array_Tour(adopted) if isinstance(tour, array) else list(adopted)
+    pos[:] = Build_Position_Index(tour)
+    changed = np.flatnonzero(~same[1:]) + 1
+    Set_DLB_off(DontLook, changed.tolist())
+
+
+# # Local_Search
+# Optimizes `firstTour` with the local search `howToSolve`; the parameters are the same of `solveTSP()`.
+# <br>
+# After it, `searchStatus["exhausted"]` tells if the search has been stopped by the budget `timeLimit`/`moveLimit` (see `Search_Budget`).
+# <br>
+# If `iterations` is not None, the local search is iterated with `Iterated_Local_Search()`.
+
+# In[ ]:
+
+
+def Local_Search(firstTour, howToSolve, improvement, speedup = "False", No_Of_Neigbors = False, Fraction_Radius = 1, representation = "array", timeLimit = None, moveLimit = None, iterations = None):
+    with Timed("local_search"):
+        if iterations is not None:
+            finalTour = Iterated_Local_Search(firstTour, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, iterations, timeLimit, moveLimit)
+        elif howToSolve == "2Opt":
+            if speedup == "False" and representation == "array":
+                finalTour = LS_2_Opt_NoSpeedup(firstTour,improvement, timeLimit, moveLimit)
+            else:   
+                finalTour = LS_2_Opt(firstTour,improvement, speedup, No_Of_Neigbors, Fraction_Radius, representation, timeLimit, moveLimit)
+        elif howToSolve == "3Opt":
+            finalTour = LS_3_Opt(firstTour, improvement, speedup, No_Of_Neigbors, representation, timeLimit, moveLimit)
+        elif howToSolve == "OrOpt":
+            finalTour = LS_Or_Opt(firstTour, improvement, speedup, No_Of_Neigbors, Fraction_Radius, representation, timeLimit, moveLimit)
+        elif howToSolve == "LK":
+            finalTour = LS_LK(firstTour, improvement, No_Of_Neigbors, timeLimit, moveLimit)
+        return finalTour
+
+
 # # solveTSP
 # The main function callable from the user.
 # Its parameters, with which the user can test the various cases, are: 
 # <br>
-# `firstSolution`: tour created randomly or with nearest neighbor technique;
+# `firstSolution`: tour created randomly ("random"), with nearest neighbor technique ("NN"), with greedy edge technique ("greedy") or along a space-filling curve ("hilbert");
 # <br>
-# `howToSolve`: technique used for the local search: 2Opt, OrOpt or 3Opt;
+# `howToSolve`: technique used for the local search: 2Opt, OrOpt, 3Opt or LK (Lin-Kernighan, see `LS_LK()`);
 # <br>
 # `improvement`: best taken or first taken;
 # <br>
@@ -1022,59 +2937,645 @@ def One_City_Or_Opt(tour, basePos, improvement):
 # <br>
 # `speedup`: the speedup chosen, or False if not used any speedup (it is False if not chosen one by default);
 # <br>
-# `No_Of_Neigbors`: number of neighbors (taken into account only if there is a speedup with NeighborList) (it is False if not chosen explicity by default); 
+# `No_Of_Neigbors`: number of neighbors (taken into account only if there is a speedup with NeighborList, or with LK) (it is False if not chosen explicity by default); 
 # <br>
 # `Fraction_Radius`: the fraction of the radius to use (taken into account only if there is a speedup with FixedRadius) (it is equal to `1` by default).
 # <br>
 # The possible speedup that can be chosen are: "False", "NeighborList", "FixedRadius", "DLB" or a combination of the three types of speedup.
+# <br>
+# `representation`: "array" (by default) or "TwoLevel", the representation of the tour used by the local search (see `LS_2_Opt()`).
+# <br>
+# `headless`: if True, the final tour is only saved, without drawing it (it is False by default). The saved solution can be drawn later with `draw_loaded_tour()`, using the name written in the returned text.
+# <br>
+# `timeLimit` and `moveLimit`: the budget of the local search, in seconds and in improving moves (see `Search_Budget`), None (by default) if there is no limit; if the search is stopped by the budget, it is written in the returned text.
+# <br>
+# `iterations`: if not None, the number of kicks of the Iterated Local Search (see `Iterated_Local_Search()`, it can be `float("inf")` to stop only on `timeLimit`), that keeps improving the local optimum until `iterations` or the budget are exhausted; the method is saved as `howToSolve` followed by "+ILS".
+# <br>
+# If `instrumentation` is True, the counts and times of the run (see `Instrumentation_Columns()`) are saved in `tsp.csv` with the other results.
 # 
 
 # In[ ]:
 
 
 import datetime
-def solveTSP(firstSolution,howToSolve,improvement,problem_to_solve,speedup = "False", No_Of_Neigbors = False, Fraction_Radius = 1):
-    global problem, counter_call_Make_2_Opt_Move, counter_call_Gain_From_2_Opt, counter_call_One_City_2_Opt
-    counter_call_Gain_From_2_Opt = 0
-    counter_call_Make_2_Opt_Move = 0
-    counter_call_One_City_2_Opt = 0
-    problem = load_problem(problem_to_solve)
+def solveTSP(firstSolution,howToSolve,improvement,problem_to_solve,speedup = "False", No_Of_Neigbors = False, Fraction_Radius = 1, representation = "array", headless = False, timeLimit = None, moveLimit = None, iterations = None):
+    global problem
+    Reset_Instrumentation()
+    with Timed("load_problem"):
+        problem = load_problem(problem_to_solve)
     nodes = list(problem.get_nodes())
     start_time = datetime.datetime.now()
-    if firstSolution == "NN":
-        firstTour = Build_Nearest_Neighbor_Tour(1+(int)(random.random()*len(nodes)), nodes)
-    elif firstSolution == "random":
-        firstTour = Build_Random_Tour(nodes)
+    firstTour = Build_First_Tour(firstSolution, nodes)
     first_distance = totalDistance(firstTour)
     text = "The total distance of the initial tour is: " + str(first_distance) + "\n"
-    if howToSolve == "2Opt":
-        if speedup == "False":
-            finalTour = LS_2_Opt_NoSpeedup(firstTour,improvement)
-        else:   
-            finalTour = LS_2_Opt(firstTour,improvement, speedup, No_Of_Neigbors, Fraction_Radius)
-    elif howToSolve == "3Opt":
-        finalTour = LS_3_Opt(firstTour, improvement, speedup, No_Of_Neigbors)
-    elif howToSolve == "OrOpt":
-        finalTour = LS_Or_Opt(firstTour, improvement)
+    finalTour = Local_Search(firstTour, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, representation, timeLimit, moveLimit, iterations)
     final_time = datetime.datetime.now()
+    if iterations is not None:
+        howToSolve += "+ILS"
     time_to_solve = (final_time-start_time).total_seconds()
-    final_distance = totalDistance(finalTour)
+    final_distance = searchStatus["length"] # updated with the gain of each move
     text += "The total distance of the final tour is: " + str(final_distance)
     text += "\nSolution found in " + str(time_to_solve) + " seconds"
-    save_in_file(problem_to_solve,firstSolution,howToSolve,improvement,speedup, finalTour)
+    if searchStatus["exhausted"]:
+        text += "\nThe search has been stopped by the budget after " + str(searchStatus["moves"]) + " moves: the tour may not be locally optimal"
+    solution = save_in_file(problem_to_solve,firstSolution,howToSolve,improvement,speedup, finalTour)
+    text += "\nSolution saved as " + str(solution)
     optimal_distance = check_optimal_solution(problem_to_solve)
-    save_time_and_distance(problem_to_solve,firstSolution,howToSolve,improvement,speedup,No_Of_Neigbors,Fraction_Radius,time_to_solve,first_distance, final_distance, optimal_distance)
-    if howToSolve == "2Opt" and speedup == "False":
-        save_counters(problem_to_solve,improvement,counter_call_Make_2_Opt_Move, counter_call_Gain_From_2_Opt, counter_call_One_City_2_Opt, time_to_solve)
-    graph_t = draw_tour(finalTour) #TO PLOT THE TOUR
-    plot_tour(graph_t)
+    save_time_and_distance(problem_to_solve,firstSolution,howToSolve,improvement,speedup,No_Of_Neigbors,Fraction_Radius,time_to_solve,first_distance, final_distance, optimal_distance,
+                           Instrumentation_Columns() if instrumentation else None, representation, timeLimit, moveLimit, iterations)
+    if howToSolve == "2Opt" and speedup == "False" and instrumentation:
+        save_counters(problem_to_solve,improvement,counters["Make_2_Opt_Move"], counters["Gain_From_2_Opt"], counters["One_City_2_Opt"], time_to_solve)
+    if not headless:
+        show_tour(finalTour)
     return text
 
 
+# # solveTSP_Progress
+# Generator version of `solveTSP()`, for the long searches: it loads the problem, builds the initial tour and runs `Local_Search()` (with the same parameters of `solveTSP()`) in a separate thread, and every `interval` seconds it yields a progress event, a dictionary with:
+# <br>
+# `sweep` (the number of cities searched divided by N, the number of sweeps over all the cities that would cost the same), `moves` (the improving moves applied), `length` (the length of the current tour), `elapsed` (seconds from the start) and `activeCities` (the cities in the queue of the DLB, see `DontLookBits`, or None if the search doesn't use it).
+# <br>
+# At the end it yields a last event with also `finished` True, `tour` (the final tour) and `locallyOptimal` (False if the search has been stopped by the budget). The final tour is not saved or drawn: it can be saved with `save_in_file()`.
+# <br>
+# If the generator is closed before the end (with `close()`, or leaving a `for` loop over it), the search is stopped at the next city (see `Search_Budget`) and its thread ends. Only one search at a time can run in a process, because the searches use the global state of the module.
+
+# In[ ]:
+
+
+import threading
+import queue
+def solveTSP_Progress(firstSolution, howToSolve, improvement, problem_to_solve, speedup = "False", No_Of_Neigbors = False, Fraction_Radius = 1, representation = "array", timeLimit = None, moveLimit = None, iterations = None, interval = 1):
+    global problem, Progress_Hook
+    problem = load_problem(problem_to_solve)
+    firstTour = Build_First_Tour(firstSolution, list(problem.get_nodes()))
+    N = len(firstTour) - 1
+    events = queue.Queue()
+    result = {}
+    start = time.perf_counter()
+    nextEvent = [start]
+    def Progress_Event():
+        DontLook = searchStatus["DontLook"]
+        return {"sweep": searchStatus["searched"] // N, "moves": searchStatus["moves"], "length": searchStatus["length"], "elapsed": time.perf_counter() - start,
+                "activeCities": None if DontLook is None else len(DontLook.active)}
+    def Report_Progress():
+        if time.perf_counter() >= nextEvent[0]:
+            nextEvent[0] += interval
+            events.put(Progress_Event())
+    def Search():
+        try:
+            result["tour"] = Local_Search(firstTour, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, representation, timeLimit, moveLimit, iterations)
+        except BaseException as error:
+            result["error"] = error
+        finally:
+            events.put(None)
+    searchStatus["stop"] = False
+    Progress_Hook = Report_Progress
+    search = threading.Thread(target = Search, daemon = True)
+    search.start()
+    try:
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            yield event
+        if "error" in result:
+            raise result["error"]
+        event = Progress_Event()
+        event.update({"finished": True, "tour": list(result["tour"]), "locallyOptimal": not searchStatus["exhausted"]})
+        yield event
+    finally: # also when the generator is closed: the search stops at the next city
+        searchStatus["stop"] = True
+        search.join()
+        searchStatus["stop"] = False
+        Progress_Hook = None
+
+
+# # solveTSP_MultiStart
+# Runs `starts` independent local searches of the problem `problem_to_solve` in parallel, in a `ProcessPoolExecutor` with `workers` processes (by default, one for each core), and returns the best final tour and a list with the statistics of each start.
+# <br>
+# The start number `start` builds its initial tour with `firstSolution` after `random.seed(seed + start)`, so the starts are different and can be repeated; the other parameters are the same of `solveTSP()`, `timeLimit` and `moveLimit` are the budget of the local search of each start (see `Search_Budget`), and with `iterations` each start is an Iterated Local Search (see `Iterated_Local_Search()`).
+# <br>
+# The coordinates, the distance matrix and the matrix of the neighbors (if used by the local search) are built once and put in shared memory (see `Share_Array()`): every process reads the same arrays instead of receiving a copy of them, so only the tsp file is read again by each process. The processes receive the path of the tsp file and the settings of the module (see `Worker_Settings()`), so they work also when they are started with `spawn` (the default on Windows and macOS), that doesn't copy the globals changed after the import.
+# <br>
+# The statistics of a start are a dictionary with `seed`, `firstDistance`, `finalDistance`, `timeToSolve`, `locallyOptimal` (False if the search has been stopped by a budget) and `instrumentation` (see `Multi_Start_Run()`).
+
+# In[ ]:
+
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+def solveTSP_MultiStart(firstSolution, howToSolve, improvement, problem_to_solve, speedup = "False", No_Of_Neigbors = False, Fraction_Radius = 1, representation = "array", starts = 8, workers = None, seed = 0, timeLimit = None, moveLimit = None, iterations = None):
+    global problem
+    problem = load_problem(problem_to_solve)
+    sharedArrays = Share_Problem(Neighbors_Needed(howToSolve, speedup, No_Of_Neigbors))
+    try:
+        with ProcessPoolExecutor(max_workers = workers, initializer = Multi_Start_Init,
+                                 initargs = (os.path.abspath(Data_File(problem_to_solve)), {name: descriptor for name, (memory, descriptor) in sharedArrays.items()}, Worker_Settings())) as executor:
+            runs = [executor.submit(Multi_Start_Run, firstSolution, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, representation, seed + start, timeLimit, moveLimit, iterations)
+                    for start in range(starts)]
+            results = [run.result() for run in runs]
+    finally:
+        Release_Shared(sharedArrays)
+    statistics = [result[0] for result in results]
+    bestTour = min(results, key = lambda result: result[0]["finalDistance"])[1]
+    return bestTour, statistics
+
+
+# # Neighbors_Needed
+# Returns the number of neighbors of each city that the local search `howToSolve` uses with `speedup` and `No_Of_Neigbors` (see `LS_2_Opt()` and `LS_LK()`) for the loaded problem, or 0 if it doesn't use the Neighbor List.
+
+# In[ ]:
+
+
+def Neighbors_Needed(howToSolve, speedup, No_Of_Neigbors):
+    N = len(list(problem.get_nodes()))
+    if howToSolve == "LK":
+        No_Of_Neighbors = LK_No_Of_Neighbors if No_Of_Neigbors == False else No_Of_Neigbors
+    elif "NeighborList" in speedup:
+        No_Of_Neighbors = (int)(N/10) if No_Of_Neigbors == False else No_Of_Neigbors
+    else:
+        return 0
+    return min(No_Of_Neighbors, N-1)
+
+
+# # Share_Problem
+# Puts in shared memory (see `Share_Array()`) the coordinates and the distance matrix of the loaded problem and, if `No_Of_Neighbors` is not 0, the matrix of its `No_Of_Neighbors` nearest neighbors, that becomes the global `sharedNeighbors`.
+# <br>
+# It returns a dictionary with the name of each global array and its `SharedMemory` object and descriptor; the memory must be released with `Release_Shared()`. The arrays opened from the cache (see `Preprocessing_Cache`) are not copied: their descriptor is the path of their file, and there is no `SharedMemory` object.
+
+# In[ ]:
+
+
+def Share_Problem(No_Of_Neighbors):
+    global sharedNeighbors
+    if No_Of_Neighbors > 0:
+        N = len(list(problem.get_nodes()))
+        neighbor = Build_Neighbors_Matrix(No_Of_Neighbors, N)
+        if sharedNeighbors is None or sharedNeighbors.shape[1] < No_Of_Neighbors: # not in the cache
+            nearest = np.array(neighbor[1:], dtype=np.int32)
+            sharedNeighbors = np.vstack([np.zeros((1, nearest.shape[1]), dtype=np.int32), nearest])
+    sharedArrays = {}
+    for name, values in [("coordinates", coordinates), ("distanceMatrix", distanceMatrix), ("sharedNeighbors", sharedNeighbors)]:
+        if isinstance(values, np.memmap): # a file of the cache: the processes open it again, sharing its pages
+            sharedArrays[name] = (None, values.filename)
+        elif values is not None:
+            sharedArrays[name] = Share_Array(values)
+    return sharedArrays
+
+
+# # Release_Shared
+# Closes and frees the shared memory created by `Share_Problem()`.
+
+# In[ ]:
+
+
+def Release_Shared(sharedArrays):
+    for memory, descriptor in sharedArrays.values():
+        if memory is not None:
+            memory.close()
+            memory.unlink()
+
+
+# # Share_Array
+# Copies the `numpy` array `values` in a new block of shared memory. It returns the `SharedMemory` object (that must be closed and unlinked at the end) and the descriptor (name, shape, type) used by `Attach_Shared_Array()` to read it from another process.
+
+# In[ ]:
+
+
+def Share_Array(values):
+    memory = shared_memory.SharedMemory(create = True, size = max(values.nbytes, 1))
+    np.ndarray(values.shape, dtype = values.dtype, buffer = memory.buf)[...] = values
+    return memory, (memory.name, values.shape, values.dtype.str)
+
+
+# # Attach_Shared_Array
+# Returns the `SharedMemory` object and the `numpy` array (without copying it) of the shared memory with descriptor `descriptor` (see `Share_Array()`). If the descriptor is the path of a file of the cache, the file is opened with `np.load(mmap_mode="r")` and there is no `SharedMemory` object.
+
+# In[ ]:
+
+
+def Attach_Shared_Array(descriptor):
+    if isinstance(descriptor, str):
+        return None, np.load(descriptor, mmap_mode="r")
+    name, shape, dtype = descriptor
+    memory = shared_memory.SharedMemory(name = name)
+    return memory, np.ndarray(shape, dtype = dtype, buffer = memory.buf)
+
+
+# # Multi_Start_Init
+# Initializes a process of `solveTSP_MultiStart()`: it sets the `settings` of the main process (see `Worker_Settings()`), reads the tsp file and attaches the global arrays (`coordinates`, `distanceMatrix` and `sharedNeighbors`) to the shared memory described in `descriptors`.
+# <br>
+# The `SharedMemory` objects are kept in `attachedMemory`, so that the arrays remain valid until the process ends.
+
+# In[ ]:
+
+
+attachedMemory = []
+def Multi_Start_Init(problem_to_solve, descriptors, settings = None):
+    global problem, coordinates, distanceMatrix, sharedNeighbors
+    if settings is not None:
+        Set_Worker_Settings(settings)
+    problem = Read_Problem(problem_to_solve)
+    arrays = {"coordinates": None, "distanceMatrix": None, "sharedNeighbors": None}
+    for name, descriptor in descriptors.items():
+        memory, arrays[name] = Attach_Shared_Array(descriptor)
+        if memory is not None:
+            attachedMemory.append(memory)
+    coordinates = arrays["coordinates"]
+    distanceMatrix = arrays["distanceMatrix"]
+    sharedNeighbors = arrays["sharedNeighbors"]
+
+
+# # Worker_Settings
+# Returns the values of the settings of the module in the main process (the directories, the cache, `instrumentation`, the backends and the parameters of the searches, listed in `Worker_Setting_Names`), that the processes of `solveTSP_MultiStart()`, `Batch_Solve()`, `solveTSP_Islands()` and `solveTSP_Decomposition()` set in their initialization with `Set_Worker_Settings()`. With `spawn` a process imports the module again, so without them it would use the default values.
+
+# In[ ]:
+
+
+Worker_Setting_Names = ["TSP_Directory", "Solutions_Directory", "Use_Cache", "Cache_Directory", "Cache_Min_Neighbors", "Cache_Max_Bytes", "instrumentation", "Length_Check_Every",
+                        "Max_Distance_Matrix_Cities", "Greedy_No_Of_Neighbors", "Hilbert_Order", "Min_Numpy_Reversal", "Vectorized_Gains", "Vectorized_Tile_Size", "Use_JIT",
+                        "LK_Breadth", "LK_Max_Depth", "LK_No_Of_Neighbors", "ILS_Kick_Length", "Boundary_No_Of_Neighbors"]
+def Worker_Settings():
+    return {name: globals()[name] for name in Worker_Setting_Names}
+
+def Set_Worker_Settings(settings):
+    globals().update(settings)
+
+
+# # Multi_Start_Run
+# One start of `solveTSP_MultiStart()`, executed in a process of the pool: it returns the statistics of the start and the final tour.
+# <br>
+# The statistics include also the counts and times of the start in `instrumentation` (see `Instrumentation_Columns()`), or None if `instrumentation` is False.
+
+# In[ ]:
+
+
+def Multi_Start_Run(firstSolution, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, representation, seed, timeLimit = None, moveLimit = None, iterations = None):
+    Reset_Instrumentation()
+    random.seed(seed)
+    nodes = list(problem.get_nodes())
+    start_time = datetime.datetime.now()
+    firstTour = Build_First_Tour(firstSolution, nodes)
+    first_distance = totalDistance(firstTour)
+    finalTour = Local_Search(firstTour, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, representation, timeLimit, moveLimit, iterations)
+    time_to_solve = (datetime.datetime.now()-start_time).total_seconds()
+    statistics = {"seed": seed, "firstDistance": first_distance, "finalDistance": searchStatus["length"], "timeToSolve": time_to_solve, "locallyOptimal": not searchStatus["exhausted"],
+                  "instrumentation": Instrumentation_Columns() if instrumentation else None}
+    return statistics, list(finalTour)
+
+
+# # solveTSP_Islands
+# Island model of the Iterated Local Search (see `Iterated_Local_Search()`): `islands` processes run in parallel the ILS of `howToSolve` (2Opt, 3Opt, OrOpt or LK) from different initial tours (built with `firstSolution` after `random.seed(seed + island)`, and published at once as global best if they are the shortest), and every `exchangeInterval` kicks (an epoch) each island compares its best tour with the best tour of all the islands, kept in shared memory (see `Island_Exchange()`): it publishes its tour if it is better, or else adopts the global best and goes on perturbing it with its own random kicks. Each island runs a single ILS, so its tour, Neighbor List and DLB are kept from an epoch to the other.
+# <br>
+# The islands stop after `epochs` epochs (None for no limit), after `timeLimit` seconds, or as soon as the global best is not longer than `target` (for example the length at a given gap from the optimum); at least one of them should be given. As in `solveTSP_MultiStart()`, the arrays of the problem are shared with `Share_Problem()`.
+# <br>
+# It returns the best tour and, for each island, its convergence log: a list with a dictionary for each epoch with `epoch`, `time` (seconds from the start of the island), `length` (the best length of the island before the exchange), `bestLength` (the global best after it) and `adopted` (True if the island has taken the global best).
+
+# In[ ]:
+
+
+import multiprocessing
+def solveTSP_Islands(firstSolution, howToSolve, improvement, problem_to_solve, speedup = "NeighborList+DLB", No_Of_Neigbors = False, Fraction_Radius = 1, islands = 8, seed = 0, exchangeInterval = 100, epochs = None, timeLimit = None, target = None):
+    global problem
+    problem = load_problem(problem_to_solve)
+    N = len(list(problem.get_nodes()))
+    sharedArrays = Share_Problem(Neighbors_Needed(howToSolve, "NeighborList", No_Of_Neigbors))
+    globalBest = np.zeros(N + 3, dtype=np.int64) # length, island, closed tour
+    globalBest[0] = np.iinfo(np.int64).max
+    sharedArrays["globalBest"] = Share_Array(globalBest)
+    try:
+        with ProcessPoolExecutor(max_workers = islands, initializer = Island_Init,
+                                 initargs = (os.path.abspath(Data_File(problem_to_solve)), {name: descriptor for name, (memory, descriptor) in sharedArrays.items()}, multiprocessing.RLock(), Worker_Settings())) as executor:
+            runs = [executor.submit(Island_Run, island, firstSolution, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, seed + island, exchangeInterval, epochs, timeLimit, target)
+                    for island in range(islands)]
+            logs = [run.result() for run in runs]
+        memory, globalBest = Attach_Shared_Array(sharedArrays["globalBest"][1])
+        published = globalBest[0] != np.iinfo(np.int64).max
+        bestTour = globalBest[2:].tolist()
+        memory.close()
+    finally:
+        Release_Shared(sharedArrays)
+    if not published:
+        raise RuntimeError("no island has published a tour")
+    return bestTour, logs
+
+
+# # Island_Init
+# Initializes a process of `solveTSP_Islands()` as `Multi_Start_Init()`, with the path of the tsp file and the `settings` of the main process (see `Worker_Settings()`), and attaches the global best tour to `islandBest`; `islandLock` is the lock shared by all the islands to read and write it.
+
+# In[ ]:
+
+
+islandBest = None
+islandLock = None
+def Island_Init(problem_to_solve, descriptors, lock, settings):
+    global islandBest, islandLock
+    descriptors = dict(descriptors)
+    memory, islandBest = Attach_Shared_Array(descriptors.pop("globalBest"))
+    attachedMemory.append(memory)
+    islandLock = lock
+    Multi_Start_Init(problem_to_solve, descriptors, settings)
+
+
+# # Island_Run
+# One island of `solveTSP_Islands()`, executed in a process of the pool: it publishes its initial tour (see `Island_Publish()`), then runs a single `Iterated_Local_Search()` that calls `Island_Exchange()` every `exchangeInterval` kicks (the end of an epoch), and returns its convergence log.
+
+# In[ ]:
+
+
+def Island_Run(island, firstSolution, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, seed, exchangeInterval, epochs, timeLimit, target):
+    Reset_Instrumentation()
+    random.seed(seed)
+    start = time.perf_counter()
+    tour = Build_First_Tour(firstSolution, list(problem.get_nodes()))
+    Island_Publish(island, tour, totalDistance(tour))
+    log = []
+    def Exchange(bestTour, length):
+        adopted, bestLength = Island_Exchange(island, list(bestTour) + [bestTour[0]], length)
+        log.append({"epoch": len(log) + 1, "time": time.perf_counter() - start, "length": length, "bestLength": bestLength, "adopted": adopted is not None})
+        stop = (target != None and bestLength <= target) or (epochs != None and len(log) >= epochs)
+        return None if adopted is None else adopted[:-1], bestLength, stop
+    iterations = float("inf") if epochs == None else epochs * exchangeInterval
+    Iterated_Local_Search(tour, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, iterations, timeLimit, None, Exchange, exchangeInterval)
+    return log
+
+
+# # Island_Exchange
+# Compares the closed tour `tour` of the island `island`, of length `length`, with the global best tour in `islandBest`: if it is shorter it becomes the global best, if it is longer the island takes a copy of the global best. It returns the copy of the global best (closed, None if the island keeps its tour) and the length of the global best.
+# <br>
+# `Island_Publish()` only makes `tour` the global best if it is shorter, and returns True in this case.
+
+# In[ ]:
+
+
+def Island_Exchange(island, tour, length):
+    with islandLock:
+        if Island_Publish(island, tour, length) or length == islandBest[0]:
+            return None, length
+        return islandBest[2:].tolist(), int(islandBest[0])
+
+def Island_Publish(island, tour, length):
+    with islandLock:
+        if length < islandBest[0]:
+            islandBest[0], islandBest[1] = length, island
+            islandBest[2:] = tour
+            return True
+        return False
+
+
+# # solveTSP_Decomposition
+# Solves the large problems with coordinates by geometric decomposition: the cities, in the order of the Hilbert curve (see `Build_Hilbert_Tour()`), are cut in clusters of about `clusterSize` near cities, and the sub-tour of each cluster is solved by `Cluster_Run()` in a `ProcessPoolExecutor` with `workers` processes (by default, one for each core), with the initial tour `firstSolution` and the local search `howToSolve` (the parameters are the ones of `solveTSP()`, and `iterations` is passed to `Local_Search()`).
+# <br>
+# The sub-tours are joined in the order of the clusters by `Stitch_Sub_Tours()`, and the joined tour is improved by `Boundary_Local_Search()` with `finishWith` ("2Opt" or "OrOpt") only around the borders of the clusters. So the time grows with the size of the clusters and is divided by the number of the cores, instead of growing with N².
+# <br>
+# It returns the final tour and a dictionary with the statistics: `clusters`, `stitchedDistance` (the length of the joined tour), `boundaryCities` (the cities searched by the final local search), `finalDistance` and `timeToSolve`.
+
+# In[ ]:
+
+
+def solveTSP_Decomposition(firstSolution, howToSolve, improvement, problem_to_solve, speedup = "NeighborList+DLB", No_Of_Neigbors = False, Fraction_Radius = 1, clusterSize = 2000, workers = None, seed = 0, finishWith = "2Opt", iterations = None):
+    global problem
+    problem = load_problem(problem_to_solve)
+    if coordinates is None:
+        raise NotImplementedError("the decomposition needs the coordinates of the cities")
+    start_time = datetime.datetime.now()
+    nodes = list(problem.get_nodes())
+    order = np.array(Build_Hilbert_Tour(nodes)[:-1])
+    clusters = np.array_split(order, -(-len(order) // clusterSize))
+    with ProcessPoolExecutor(max_workers = workers, initializer = Set_Worker_Settings, initargs = (Worker_Settings(),)) as executor:
+        runs = [executor.submit(Cluster_Run, coordinates[cluster], problem.edge_weight_type, firstSolution, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, iterations, seed + index)
+                for index, cluster in enumerate(clusters)]
+        subTours = [cluster[np.array(run.result(), dtype=np.int64) - 1] for cluster, run in zip(clusters, runs)]
+    tour = Stitch_Sub_Tours(subTours)
+    stitchedDistance = totalDistance(tour)
+    clusterOf = np.zeros(len(nodes) + 1, dtype=np.int64)
+    for index, cluster in enumerate(clusters):
+        clusterOf[cluster] = index
+    finalTour, boundaryCities = Boundary_Local_Search(tour, clusterOf, finishWith, improvement)
+    statistics = {"clusters": len(clusters), "stitchedDistance": stitchedDistance, "boundaryCities": boundaryCities, "finalDistance": searchStatus["length"],
+                  "timeToSolve": (datetime.datetime.now()-start_time).total_seconds()}
+    return finalTour, statistics
+
+
+# # Cluster_Run
+# Solves a cluster of `solveTSP_Decomposition()`, executed in a process of the pool: the cities with coordinates `points` (and distances of type `edgeType`) become the loaded problem, numbered from 1 to n (see `Load_Subproblem()`), and it returns their final tour, without the return to the first city.
+
+# In[ ]:
+
+
+def Cluster_Run(points, edgeType, firstSolution, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, iterations, seed):
+    n = len(points)
+    if n < 8: # too few cities for the local searches
+        return list(range(1, n + 1))
+    Load_Subproblem(points, edgeType)
+    random.seed(seed)
+    firstTour = Build_First_Tour(firstSolution, list(problem.get_nodes()))
+    finalTour = Local_Search(firstTour, howToSolve, improvement, speedup, No_Of_Neigbors, Fraction_Radius, "array", None, None, iterations)
+    return list(finalTour[:-1])
+
+
+# # Load_Subproblem
+# Makes the cities with coordinates `points` the loaded problem, as `load_problem()` does with a tsp file: the city `i` is `points[i-1]`, the distance matrix is built for them only, and the cache is not used.
+
+# In[ ]:
+
+
+def Load_Subproblem(points, edgeType):
+    global problem, coordinates, distanceMatrix, sharedNeighbors, problemKey
+    coordinates = np.vstack([np.zeros((1, points.shape[1])), points])
+    problem = TSPLIB_Problem({"NAME": "cluster", "TYPE": "TSP", "DIMENSION": len(points), "EDGE_WEIGHT_TYPE": edgeType}, coords = coordinates)
+    problemKey = None
+    sharedNeighbors = None
+    distanceMatrix = Build_Distance_Matrix(problem, coordinates)
+    return problem
+
+
+# # Stitch_Sub_Tours
+# Joins the closed sub-tours `subTours` (arrays of cities, without the return to the first city) in one tour, in their order: each sub-tour is opened removing one of its links, and entered from the last city of the tour built so far. The link and the direction are chosen, for all the cities of the sub-tour together with `Distances_Between()`, to minimize the length of the link entering the sub-tour minus the length of the link removed.
+
+# In[ ]:
+
+
+def Stitch_Sub_Tours(subTours):
+    tour = [int(city) for city in subTours[0]]
+    for cities in subTours[1:]:
+        entering = Distances_From(tour[-1], cities)
+        forward = entering - Distances_Between(np.roll(cities, 1), cities) # entering in cities[i], the last city is cities[i-1]
+        backward = entering - Distances_Between(cities, np.roll(cities, -1)) # entering in cities[i], the last city is cities[i+1]
+        i, j = int(np.argmin(forward)), int(np.argmin(backward))
+        if forward[i] <= backward[j]:
+            path = np.roll(cities, -i)
+        else:
+            path = np.roll(cities[::-1], j + 1 - len(cities))
+        tour.extend(path.tolist())
+    tour.append(tour[0])
+    return tour
+
+
+# # Boundary_Local_Search
+# Improves the `tour` joined by `solveTSP_Decomposition()` with the local search `finishWith` ("2Opt" or "OrOpt") with Neighbor List (of `Boundary_No_Of_Neighbors` cities) and DLB, searching only from the cities near the border of their cluster (`clusterOf[city]`): the ones with a neighbor in another cluster, and the ones linked to a city of another cluster. Their DLB are off and they are in the queue of `LS_Active_Cities()`, the DLB of the other cities are on until a move touches them.
+# <br>
+# It returns the final tour and the number of the cities searched at the start; `searchStatus["length"]` is the length of the final tour.
+
+# In[ ]:
+
+
+Boundary_No_Of_Neighbors = 8
+def Boundary_Local_Search(tour, clusterOf, finishWith, improvement):
+    tour = Build_Array_Tour(tour)
+    Start_Search(tour)
+    del tour[len(tour)-1]
+    N = len(tour)
+    neighborListLen = min(Boundary_No_Of_Neighbors, N-1)
+    neighbor = Build_Neighbors_Matrix(neighborListLen, N)
+    pos = Build_Position_Index(tour)
+    cities = np.array(tour, dtype=np.int64)
+    nearest = np.array(neighbor[1:], dtype=np.int64).reshape(N, neighborListLen)
+    border = np.zeros(N + 1, dtype=bool)
+    border[1:] = (clusterOf[nearest] != clusterOf[1:, np.newaxis]).any(axis=1)
+    crossing = clusterOf[cities] != clusterOf[np.roll(cities, -1)]
+    border[cities[crossing]] = True
+    border[np.roll(cities, -1)[crossing]] = True
+    boundary = cities[border[cities]].tolist() # in the order of the tour
+    DontLook = DontLookBits(boundary)
+    DontLook.update((city, True) for city in tour if city not in DontLook)
+    speedup = "NeighborList+DLB"
+    if finishWith == "OrOpt":
+        searchFromCity = lambda baseCity: One_City_Or_Opt_NDR(tour, pos[baseCity], neighbor, neighborListLen, DontLook, improvement, speedup, 1, pos)
+    else:
+        searchFromCity = lambda baseCity: One_City_2_Opt_NDR(tour, pos[baseCity], neighbor, neighborListLen, DontLook, improvement, speedup, 1, pos)
+    LS_Active_Cities(tour, DontLook, searchFromCity)
+    tour.append(tour[0])
+    return tour, len(boundary)
+
+
+# # Batch_Solve
+# Runs all the combinations of the parameters of `solveTSP()` in `grid` on all the problems in `instances` (by default all the `.tsp` files in `ALL_tsp`), and saves the results in `tsp.csv` (see `save_time_and_distance()`).
+# <br>
+# `grid` is a dictionary from the name of a parameter of `solveTSP()` (`firstSolution`, `howToSolve`, `improvement`, `speedup`, `No_Of_Neigbors`, `Fraction_Radius`, `representation`, `timeLimit`, `moveLimit`, `iterations`) to the list of its values; the parameters not in `grid` have their default value. Every combination is run `repetitions` times, with `random.seed(seed + repetition)`.
+# <br>
+# Every problem is loaded once, with its optimal distance, its distance matrix and the neighbors for all the runs (put in shared memory, see `Share_Problem()`); then the runs are executed by `workers` processes (by default, one for each core), see `Batch_Worker()`. A run that takes more than `timeout` seconds is stopped (its process is terminated and replaced): it is saved with the time `timeout` and without distances.
+# <br>
+# The rows are written all together at the end, or every `flushEvery` rows if it is given, with `Save_Rows()`. The rows are also returned as a list of dictionaries.
+
+# In[ ]:
+
+
+import itertools
+import multiprocessing
+from multiprocessing.connection import wait
+def Batch_Solve(grid, instances = None, workers = None, timeout = None, repetitions = 1, seed = 0, flushEvery = None):
+    global problem
+    if instances == None:
+        instances = sorted(name for name in os.listdir(TSP_Directory) if name.endswith(".tsp"))
+    if workers == None:
+        workers = os.cpu_count()
+    names = ["firstSolution", "howToSolve", "improvement", "speedup", "No_Of_Neigbors", "Fraction_Radius", "representation", "timeLimit", "moveLimit", "iterations"]
+    defaults = {"firstSolution": "NN", "howToSolve": "2Opt", "improvement": "First", "speedup": "False", "No_Of_Neigbors": False, "Fraction_Radius": 1, "representation": "array", "timeLimit": None, "moveLimit": None, "iterations": None}
+    combinations = [dict(zip(names, values)) for values in itertools.product(*[grid.get(name, [defaults[name]]) for name in names])]
+    allRows = []
+    rows = []
+    for problem_to_solve in instances:
+        problem = load_problem(problem_to_solve)
+        optimal_distance = check_optimal_solution(problem_to_solve)
+        No_Of_Neighbors = max(Neighbors_Needed(parameters["howToSolve"], parameters["speedup"], parameters["No_Of_Neigbors"]) for parameters in combinations)
+        sharedArrays = Share_Problem(No_Of_Neighbors)
+        descriptors = {name: descriptor for name, (memory, descriptor) in sharedArrays.items()}
+        dataFile, settings = os.path.abspath(Data_File(problem_to_solve)), Worker_Settings()
+        tasks = [(parameters, seed + repetition) for parameters in combinations for repetition in range(repetitions)]
+        pool = []
+        try:
+            while len(tasks) > 0 or any(worker["task"] != None for worker in pool):
+                pool = [worker for worker in pool if worker["process"].is_alive() or worker["task"] != None]
+                while len(pool) < min(workers, len(tasks) + sum(worker["task"] != None for worker in pool)):
+                    pool.append(Start_Batch_Worker(dataFile, descriptors, settings))
+                for worker in pool:
+                    if worker["task"] == None and len(tasks) > 0:
+                        worker["task"] = tasks.pop(0)
+                        worker["start"] = datetime.datetime.now()
+                        worker["connection"].send(worker["task"])
+                busy = [worker for worker in pool if worker["task"] != None]
+                waitTime = None
+                if timeout != None:
+                    waitTime = max(0, min(timeout - (datetime.datetime.now() - worker["start"]).total_seconds() for worker in busy))
+                ready = wait([worker["connection"] for worker in busy], waitTime)
+                for worker in busy:
+                    parameters, runSeed = worker["task"]
+                    if worker["connection"] in ready:
+                        try:
+                            statistics = worker["connection"].recv()
+                        except EOFError: # the process has ended without an answer
+                            statistics = {"firstDistance": None, "finalDistance": None, "timeToSolve": None, "instrumentation": None}
+                            Stop_Batch_Worker(worker)
+                    elif timeout != None and (datetime.datetime.now() - worker["start"]).total_seconds() >= timeout:
+                        statistics = {"firstDistance": None, "finalDistance": None, "timeToSolve": timeout, "instrumentation": None}
+                        Stop_Batch_Worker(worker)
+                    else:
+                        continue
+                    worker["task"] = None
+                    rows.append(Time_And_Distance_Row(problem_to_solve, parameters["firstSolution"], parameters["howToSolve"], parameters["improvement"], parameters["speedup"], parameters["No_Of_Neigbors"], parameters["Fraction_Radius"],
+                                                      statistics["timeToSolve"], statistics["firstDistance"], statistics["finalDistance"], optimal_distance, statistics["instrumentation"],
+                                                      parameters["representation"], parameters["timeLimit"], parameters["moveLimit"], parameters["iterations"]))
+                    if flushEvery != None and len(rows) >= flushEvery:
+                        Save_Rows(rows, Solution_File('tsp.csv'))
+                        allRows += rows
+                        rows = []
+        finally:
+            for worker in pool:
+                Stop_Batch_Worker(worker)
+            Release_Shared(sharedArrays)
+    if len(rows) > 0:
+        Save_Rows(rows, Solution_File('tsp.csv'))
+    return allRows + rows
+
+
+# # Start_Batch_Worker
+# Starts a process of `Batch_Solve()` for the tsp file `problem_to_solve` with the shared arrays `descriptors` and the `settings` of the main process (see `Worker_Settings()`, they are passed also because the process can be started with `spawn`): it returns a dictionary with the `process`, the `connection` to send it the runs and receive the results, the `task` it is running (None if it is free) and when it was `start`ed.
+
+# In[ ]:
+
+
+def Start_Batch_Worker(problem_to_solve, descriptors, settings):
+    connection, workerConnection = multiprocessing.Pipe()
+    process = multiprocessing.Process(target = Batch_Worker, args = (workerConnection, problem_to_solve, descriptors, settings), daemon = True)
+    process.start()
+    workerConnection.close()
+    return {"process": process, "connection": connection, "task": None, "start": None}
+
+
+# # Stop_Batch_Worker
+# Stops the process of a worker of `Batch_Solve()`, also if it is running.
+
+# In[ ]:
+
+
+def Stop_Batch_Worker(worker):
+    if worker["process"].is_alive():
+        worker["process"].terminate()
+    worker["process"].join()
+    worker["connection"].close()
+
+
+# # Batch_Worker
+# The function executed by a process of `Batch_Solve()`: after `Multi_Start_Init()`, it receives the runs (the parameters and the seed) from `connection`, executes them with `Multi_Start_Run()` and sends back the statistics, until the process is stopped.
+
+# In[ ]:
+
+
+def Batch_Worker(connection, problem_to_solve, descriptors, settings):
+    Multi_Start_Init(problem_to_solve, descriptors, settings)
+    while True:
+        parameters, seed = connection.recv()
+        statistics, finalTour = Multi_Start_Run(parameters["firstSolution"], parameters["howToSolve"], parameters["improvement"], parameters["speedup"],
+                                                parameters["No_Of_Neigbors"], parameters["Fraction_Radius"], parameters["representation"], seed,
+                                                parameters["timeLimit"], parameters["moveLimit"], parameters["iterations"])
+        connection.send(statistics)
+
+
 # # save_counters
 # It saves in `counters.csv` the values of the counter of some functions.
 # <br>
-# In particular, it is called in the case of 2Opt method, without speedup, to compare the first and best improvements.
+# In particular, it is called in the case of 2Opt method, without speedup, to compare the first and best improvements, if `instrumentation` is True (the counters are collected only then, see `Instrumentation`).
 # <br>
 # The column of `counters.csv` are: 
 # <br>
@@ -1094,6 +3595,7 @@ def solveTSP(firstSolution,howToSolve,improvement,problem_to_solve,speedup = "Fa
 
 
 def save_counters(filename,improvement,c1, c2, c3, time_to_solve):
+    import pandas as pd # imported only when the results are saved, so the processes that only solve don't load it
     df = pd.DataFrame({'problem': [filename],
                    'improvement': [improvement],
                    'timeToSolve': [time_to_solve],
@@ -1101,14 +3603,14 @@ def save_counters(filename,improvement,c1, c2, c3, time_to_solve):
                    'call_Gain_From_2_Opt': [c2],
                    'call_One_City_2_Opt': [c3]})
 
-    if path.isfile('Network Optimization\\solutions\\counters.csv') == False:
-        df.to_csv('Network Optimization\\solutions\\counters.csv', mode = 'w', index = False)
+    if path.isfile(Solution_File('counters.csv')) == False:
+        df.to_csv(Solution_File('counters.csv'), mode = 'w', index = False)
     else:
-        df.to_csv('Network Optimization\\solutions\\counters.csv', mode = 'a', header=False, index = False)
+        df.to_csv(Solution_File('counters.csv'), mode = 'a', header=False, index = False)
 
 
 # # draw_initial_tour
-# Draw the initial tour for a problem in `ALL_tsp`. The parameter `firstSolution` is used to specify if to use the random method or nearest neighbor method to get the initial tour.
+# Draw the initial tour for a problem in `ALL_tsp`. The parameter `firstSolution` is used to specify the method used to get the initial tour, as in `solveTSP()`.
 
 # In[ ]:
 
@@ -1117,18 +3619,14 @@ def draw_initial_tour(problem_to_solve,firstSolution):
     global problem
     problem = load_problem(problem_to_solve)
     nodes = list(problem.get_nodes())
-    if firstSolution == "NN":
-        firstTour = Build_Nearest_Neighbor_Tour(1+(int)(random.random()*len(nodes)), nodes)
-    elif firstSolution == "random":
-        firstTour = Build_Random_Tour(nodes)
-    graph_t = draw_tour(firstTour) #TO PLOT THE TOUR
-    plot_tour(graph_t)
+    firstTour = Build_First_Tour(firstSolution, nodes)
+    show_tour(firstTour)
 
 
 # # draw_loaded_tour
 # Draw the tour of a solution found during the tests. 
 # <br>
-# The solution must be in the relative path `Network Optimization\solutions`, otherwise it can't be found.
+# The solution must be in `Solutions_Directory` (see `Data_File()`), otherwise it can't be found; the file is read by `Read_TSPLIB()`.
 
 # In[ ]:
 
@@ -1140,24 +3638,24 @@ def draw_loaded_tour(solution):
     problem_to_solve += ".tsp"
     problem = load_problem(problem_to_solve)
     nodes = list(problem.get_nodes())
-    opt = tsplib95.load('Network Optimization\\solutions\\'+str(solution)+'.tour')
+    opt = Read_TSPLIB(Solution_File(str(solution)+'.tour'))
     firstTour = opt.tours[0]
     firstTour.append(firstTour[0]) #the final city is equal to the first one, but for the standard it isn't repeated in the file, so we must add it here
     print("The total distance is "+str(totalDistance(firstTour)))
-    graph_t = draw_tour(firstTour) #TO PLOT THE TOUR
-    plot_tour(graph_t)
+    show_tour(firstTour)
 
 
 # # check_optimal_solution
-# Checks if the optimal solution is present in a file `.opt.tour`: in positive case the function get the total distance of the optimal tour (only if written between brackets in the file)
+# Checks if the optimal solution is present in a file `.opt.tour` (found by `Data_File()`, like the `.tsp` files): in positive case the function get the total distance of the optimal tour (only if written between brackets in the file)
 
 # In[ ]:
 
 
 def check_optimal_solution(filename): 
-    if path.isfile('Network Optimization\\ALL_tsp\\'+str(filename[:-4])+'.opt.tour\\'+str(filename[:-4])+'.opt.tour') == False:
+    optFile = Data_File(str(filename[:-4])+'.opt.tour')
+    if path.isfile(optFile) == False:
         return False
-    opt = tsplib95.load('Network Optimization\\ALL_tsp\\'+str(filename[:-4])+'.opt.tour\\'+str(filename[:-4])+'.opt.tour')
+    opt = Read_TSPLIB(optFile)
     touropt = opt.tours[0] #because there can be more than one optimal tour in the file
     touropt.append(touropt[0])
     return totalDistance(touropt)
@@ -1170,7 +3668,7 @@ def check_optimal_solution(filename):
 # <br>
 # `problem`: the name of the file `.tsp` used;
 # <br>
-# `firstSolution`: tour created randomly or with nearest neighbor technique;
+# `firstSolution`: the method used to create the initial tour (see `solveTSP()`);
 # <br>
 # `howToSolve`: technique used for the local search: 2Opt, OrOpt or 3Opt;
 # <br>
@@ -1178,6 +3676,12 @@ def check_optimal_solution(filename):
 # <br>
 # `speedup`: the speedup chosen, or False if not used any speedup;
 # <br>
+# `representation`: the representation of the tour used by the local search, "array" or "TwoLevel" (see `solveTSP()`);
+# <br>
+# `timeLimit` and `moveLimit`: the budget of the local search (see `Search_Budget`), empty if there is no limit;
+# <br>
+# `iterations`: the kicks of the Iterated Local Search (see `Iterated_Local_Search()`), empty if it is not used;
+# <br>
 # `timeToSolve`: the interval of time taken to obtain the final solution of the tour; 
 # <br>
 # `firstDistance`: the total distance of the initial tour;
@@ -1185,46 +3689,86 @@ def check_optimal_solution(filename):
 # `finalDistance`: the total distance of the final tour;
 # <br>
 # `optimalDistance`: the optimal distance of the tour (only if found a file `.opt.tour`)
+# <br>
+# and, if `instrumentationColumns` is passed, the counts and times of the operators and phases of the run (see `Instrumentation`).
 
 # In[ ]:
 
 
-import pandas as pd
 import os
 from os import path
-def save_time_and_distance(filename,firstSolution,howToSolve,improvement,speedup,No_Of_Neigbors,Fraction_Radius,time_to_solve,first_distance, final_distance,optimal_distance):
+def save_time_and_distance(filename,firstSolution,howToSolve,improvement,speedup,No_Of_Neigbors,Fraction_Radius,time_to_solve,first_distance, final_distance,optimal_distance, instrumentationColumns = None, representation = "array", timeLimit = None, moveLimit = None, iterations = None):
+    Save_Rows([Time_And_Distance_Row(filename,firstSolution,howToSolve,improvement,speedup,No_Of_Neigbors,Fraction_Radius,time_to_solve,first_distance, final_distance,optimal_distance, instrumentationColumns, representation, timeLimit, moveLimit, iterations)],
+              Solution_File('tsp.csv'))
+
+
+# # Time_And_Distance_Row
+# Returns the row of `tsp.csv` saved by `save_time_and_distance()`, as a dictionary from the column to its value.
+# <br>
+# If `instrumentationColumns` is given (see `Instrumentation_Columns()`), its columns are added after the other ones.
+
+# In[ ]:
+
+
+def Time_And_Distance_Row(filename,firstSolution,howToSolve,improvement,speedup,No_Of_Neigbors,Fraction_Radius,time_to_solve,first_distance, final_distance,optimal_distance, instrumentationColumns = None, representation = "array", timeLimit = None, moveLimit = None, iterations = None):
     if "NeighborList" in speedup:
         if No_Of_Neigbors != False: # if the number of neighbors is specified, we save it at the end of the string for the speedup
             speedup += str(No_Of_Neigbors)
     if Fraction_Radius != 1:
         speedup += "-" + str(Fraction_Radius) # if the fraction is specified, we save it at the end of the string for the speedup (with a - before it, to distinguish from the number of neighbors)
-    df = pd.DataFrame({'problem': [filename],
-                   'firstSolution': [firstSolution],
-                   'howToSolve': [howToSolve],
-                   'improvement': [improvement],
-                   'speedup': [speedup],
-                   'timeToSolve': [time_to_solve],
-                   'firstDistance': [first_distance],
-                   'finalDistance': [final_distance],
-                   'optimalDistance': [optimal_distance]})
+    row = {'problem': filename,
+           'firstSolution': firstSolution,
+           'howToSolve': howToSolve,
+           'improvement': improvement,
+           'speedup': speedup,
+           'representation': representation,
+           'timeLimit': timeLimit,
+           'moveLimit': moveLimit,
+           'iterations': iterations,
+           'timeToSolve': time_to_solve,
+           'firstDistance': first_distance,
+           'finalDistance': final_distance,
+           'optimalDistance': optimal_distance}
+    if instrumentationColumns != None:
+        row.update(instrumentationColumns)
+    return row
+
+
+# # Save_Rows
+# Appends the `rows` (dictionaries from the column to the value) to the file `.csv` `csvFile` with a single write, writing also the header if the file doesn't exist.
+# <br>
+# The values are written in the order of the columns of the file; the missing ones are left empty, while if there are new columns the whole file is written again with them.
+
+# In[ ]:
 
-    if path.isfile('Network Optimization\\solutions\\tsp.csv') == False:
-        df.to_csv('Network Optimization\\solutions\\tsp.csv', mode = 'w', index = False)
+
+def Save_Rows(rows, csvFile):
+    import pandas as pd # imported only when the results are saved, so the processes that only solve don't load it
+    df = pd.DataFrame(rows)
+    if path.isfile(csvFile) == False:
+        df.to_csv(csvFile, mode = 'w', index = False)
     else:
-        df.to_csv('Network Optimization\\solutions\\tsp.csv', mode = 'a', header=False, index = False)
+        columns = list(pd.read_csv(csvFile, nrows = 0).columns)
+        if set(df.columns) <= set(columns):
+            df.reindex(columns = columns).to_csv(csvFile, mode = 'a', header=False, index = False)
+        else: # there are new columns (like the ones of the instrumentation): the file is written again with all the columns
+            pd.concat([pd.read_csv(csvFile), df]).to_csv(csvFile, mode = 'w', index = False)
 
 
 # # save_in_file
 # Saves in a file `.tour` the solution found following the standard for the files `.tour`
 # <br>
 # The `filename` will have the informations about how the solution has been found, separated by a underscore
+# <br>
+# It returns the name of the solution (the name of the file without `.tour`), that can be passed to `draw_loaded_tour()`.
 
 # In[ ]:
 
 
 def save_in_file(filename,firstSolution,howToSolve,improvement,speedup, finalTour):
 
-    file1 = open("Network Optimization\\solutions\\sol"+str(filename[:-4])+"_"+str(firstSolution)+"_"+str(howToSolve)+"_"+str(improvement)+"_"+str(speedup)+"_"+str(datetime.datetime.timestamp(datetime.datetime.now()))+".tour","a") 
+    solution = "sol"+str(filename[:-4])+"_"+str(firstSolution)+"_"+str(howToSolve)+"_"+str(improvement)+"_"+str(speedup)+"_"+str(datetime.datetime.timestamp(datetime.datetime.now()))
+    file1 = open(Solution_File(solution+".tour"),"a") 
     file1.write("NAME : sol"+str(filename[:-4])+".tour\n")
     file1.write("COMMENT : Solution  for "+str(filename[:-4])+"\n")
     file1.write("TYPE : TOUR\n")
@@ -1235,6 +3779,20 @@ def save_in_file(filename,firstSolution,howToSolve,improvement,speedup, finalTou
         file1.write((str)(finalTour[i])+"\n")
     file1.write("-1")
     file1.close() 
+    return solution
+
+
+# # show_tour
+# Draws the tour `t` (a list of cities, with the first city repeated at the end): the graph is built with `draw_tour()` and plotted with `plot_tour()`.
+# <br>
+# It is the only step that uses `networkx` and `plotly`: `solveTSP()` skips it with `headless`.
+
+# In[ ]:
+
+
+def show_tour(t):
+    graph_t = draw_tour(t) #TO PLOT THE TOUR
+    plot_tour(graph_t)
 
 
 # # draw_tour
@@ -1243,8 +3801,8 @@ def save_in_file(filename,firstSolution,howToSolve,improvement,speedup, finalTou
 # In[ ]:
 
 
-import networkx as nx
 def draw_tour(t): 
+    import networkx as nx # imported only when a tour is drawn
     global problem
     G = nx.Graph()
     for i in range(len(t)-1):
@@ -1264,8 +3822,8 @@ def draw_tour(t):
 # In[ ]:
 
 
-import plotly.graph_objects as go
 def plot_tour(G):
+    import plotly.graph_objects as go # imported only when a tour is plotted
     #to draw the edges, saved in G
     edge_x = []
     edge_y = []